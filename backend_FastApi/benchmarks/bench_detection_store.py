@@ -0,0 +1,83 @@
+"""
+Viewport query latency of the detection store on a synthetic table.
+
+Fills a temporary SQLite database with ``--rows`` detections scattered over Texas, then
+times /detections-style bounding-box queries at several viewport sizes, with and without a
+``type`` filter. Run from backend_FastApi:
+
+    python -m benchmarks.bench_detection_store --rows 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+# Roughly the state of Texas: lng, lat
+BOUNDS = (-106.6, 25.8, -93.5, 36.5)
+TYPES = ["light", "sign", "illumination", "sign_damage", "signal_damage", "pavement"]
+# Viewport edge in degrees: ~city block, ~city, ~metro area
+DEFAULT_VIEWPORTS = "0.01,0.1,0.5"
+
+
+def fill(store, rows, per_image=5, seed=0):
+    rng = random.Random(seed)
+    batch = []
+    for image in range(rows // per_image):
+        location = (rng.uniform(BOUNDS[1], BOUNDS[3]), rng.uniform(BOUNDS[0], BOUNDS[2]), rng.uniform(0, 360))
+        detections = [
+            {"label": "signal", "confidence": round(rng.random(), 2), "bbox": [10, 10, 50, 50]}
+            for _ in range(per_image)
+        ]
+        batch.append((f"{image:064x}", f"img{image}.jpg", TYPES[image % len(TYPES)], location, detections, time.time()))
+        if len(batch) == 2000:
+            store._write(batch)
+            batch = []
+    if batch:
+        store._write(batch)
+
+
+def time_queries(store, edge, types, queries, limit, seed=1):
+    rng = random.Random(seed)
+    times, counts = [], []
+    for _ in range(queries):
+        lng = rng.uniform(BOUNDS[0], BOUNDS[2] - edge)
+        lat = rng.uniform(BOUNDS[1], BOUNDS[3] - edge)
+        start = time.perf_counter()
+        rows, _ = store.query_detections((lng, lat, lng + edge, lat + edge), types, limit=limit)
+        times.append((time.perf_counter() - start) * 1000)
+        counts.append(len(rows))
+    times.sort()
+    return {
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1], 3),
+        "mean_rows": round(statistics.mean(counts), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time bounding-box queries against the detection store.")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--viewports", default=DEFAULT_VIEWPORTS, help="Comma-separated viewport edges in degrees")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DETECTIONS_DB"] = os.path.join(tmp, "detections.db")
+        from detectors import detection_store as store
+
+        start = time.perf_counter()
+        fill(store, args.rows)
+        print(f"📊 Inserted {args.rows} detections in {time.perf_counter() - start:.1f}s")
+        for edge in (float(v) for v in args.viewports.split(",")):
+            for types in (None, ["light"]):
+                result = time_queries(store, edge, types, args.queries, args.limit)
+                print(f"   viewport {edge:>5}° type={','.join(types) if types else 'all':<5}  {result}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Offline CPU micro-benchmarks for the detector hot paths.
+
+Times decode, preprocess, model preprocess / inference / postprocess, the end-to-end
+``detect_*_array`` call and rendering for every detector, across image sizes and batch
+sizes, and writes the results as JSON. Run from backend_FastApi:
+
+    python -m benchmarks.bench_detectors --weights stub --out bench.json
+    python -m benchmarks.bench_detectors --weights real --compare bench.json
+
+``--weights stub`` generates tiny random weights locally (no downloads, no real models
+needed); ``real`` uses the baked-in / cached model files; ``auto`` (default) picks real
+when every model file is present.
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import importlib
+
+# Detectors read these at import time: no batching delay for single calls
+os.environ.setdefault("BATCH_MAX_WAIT_MS", "0")
+
+import cv2
+import numpy as np
+
+# name -> (module, detect function, box colour); mirrors the detectors' own colours
+YOLO_DETECTORS = {
+    "light": ("trafficLightdetection", "detect_traffic_light_array", (0, 255, 0)),
+    "sign": ("trafficsign_detection", "detect_traffic_sign_array", (255, 0, 0)),
+    "illumination": ("roadway_illumination_detection", "detect_roadway_illumination_array", (255, 165, 0)),
+    "sign_damage": ("traffic_sign_damage_detection", "detect_traffic_sign_damage_array", (0, 0, 255)),
+    "signal_damage": ("traffic_signal_damage_detection", "detect_traffic_signal_damage_array", (128, 0, 128)),
+}
+DETECTORS = list(YOLO_DETECTORS) + ["pavement"]
+DEFAULT_SIZES = "640x480,1920x1080,4000x3000"
+DEFAULT_BATCH_SIZES = "1,4"
+
+
+def _parse_sizes(value):
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def synthetic_image(width, height, seed=0):
+    """Roadway-like test frame: smooth noise (JPEG-compressible like a photo) plus a few solid shapes."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(12):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(8, max(9, min(width, height) // 8)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(image, (x, y), (x + size, y + size), color, -1)
+    return image
+
+
+def _measure(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _row(detector, size, batch_size, stage, samples_ms):
+    ordered = sorted(samples_ms)
+    median = statistics.median(ordered)
+    return {
+        "detector": detector,
+        "size": f"{size[0]}x{size[1]}",
+        "batch_size": batch_size,
+        "stage": stage,
+        "median_ms": round(median, 3),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "per_image_ms": round(median / batch_size, 3),
+        "samples": len(ordered),
+    }
+
+
+def _resolve_weights(mode):
+    """Point the model registry at stub weights unless real ones are requested (or, for auto, all present)."""
+    from detectors import model_registry
+
+    present = all(
+        os.path.exists(os.path.join(model_registry.BASE_DIR, spec.filename))
+        or os.path.exists(os.path.join(model_registry.MODEL_CACHE_DIR, spec.filename))
+        for spec in model_registry.MODEL_SPECS.values()
+    )
+    if mode == "real" and not present:
+        raise SystemExit("❌ --weights real: model files missing (bake them in or set MODEL_CACHE_DIR / *_URI and run fetch_models)")
+    if mode == "real" or (mode == "auto" and present):
+        return "real"
+
+    from benchmarks.stub_models import write_stub_models
+
+    stub_dir = tempfile.mkdtemp(prefix="bench-models-")
+    os.environ.setdefault("ONNX_CACHE_DIR", os.path.join(stub_dir, "onnx"))
+    # Baked-in weights next to model_api.py would otherwise take precedence over the stubs
+    model_registry.BASE_DIR = stub_dir
+    model_registry.MODEL_CACHE_DIR = stub_dir
+    write_stub_models(stub_dir)
+    return "stub"
+
+
+def bench_yolo(name, sizes, batch_sizes, repeats, warmup):
+    from detectors.image_io import decode_image_bytes
+    from detectors.letterbox import letterbox
+    from detectors.rendering import draw_boxes
+
+    module_name, detect_name, color = YOLO_DETECTORS[name]
+    module = importlib.import_module(f"detectors.{module_name}")
+    detect = getattr(module, detect_name)
+    prefix = {"light": "TRAFFIC_LIGHT"}.get(name, name.upper())
+    conf = float(os.getenv(f"{prefix}_CONF", "0.25"))
+    iou = float(os.getenv(f"{prefix}_IOU", "0.45"))
+    module.warmup()
+
+    rows = []
+    for size in sizes:
+        image = synthetic_image(*size)
+        data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        rows.append(_row(name, size, 1, "decode", _measure(lambda: decode_image_bytes(data), repeats, warmup)))
+        rows.append(_row(name, size, 1, "preprocess", _measure(lambda: letterbox(image), repeats, warmup)))
+
+        model_input = letterbox(image).image
+        for batch_size in batch_sizes:
+            batch = [model_input] * batch_size
+            speeds = {"model_preprocess": [], "inference": [], "postprocess": []}
+
+            def predict():
+                result = module._predict_batch(batch, conf, iou)[0]
+                speed = getattr(result, "speed", None) or {}
+                for stage, key in (("model_preprocess", "preprocess"), ("inference", "inference"), ("postprocess", "postprocess")):
+                    if speed.get(key) is not None:
+                        speeds[stage].append(speed[key] * batch_size)  # speed is per image
+
+            rows.append(_row(name, size, batch_size, "predict", _measure(predict, repeats, warmup)))
+            for stage, samples in speeds.items():
+                if samples:
+                    rows.append(_row(name, size, batch_size, stage, samples[warmup:] or samples))
+
+        detections = []
+
+        def run_detect():
+            detections[:] = detect(image.copy(), "bench.jpg", render="none")[0]
+
+        rows.append(_row(name, size, 1, "detect", _measure(run_detect, repeats, warmup)))
+        boxes = [(*d["bbox"], f"{d['label']} {d['confidence']}") for d in detections if d.get("bbox")]
+
+        def render():
+            canvas = image.copy()
+            draw_boxes(canvas, boxes, color)
+            cv2.imencode(".jpg", canvas)
+
+        rows.append(_row(name, size, 1, "render", _measure(render, repeats, warmup)))
+    return rows
+
+
+def bench_pavement(sizes, batch_sizes, repeats, warmup):
+    import torch
+    from PIL import Image
+    from detectors import pavement_marking_detection as pavement
+    from detectors.image_io import decode_image_bytes
+
+    pavement.warmup()
+    model, transform = pavement._get_model_and_transform()
+
+    rows = []
+    for size in sizes:
+        image = synthetic_image(*size)
+        data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        pil_image = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]))
+        rows.append(_row("pavement", size, 1, "decode", _measure(lambda: decode_image_bytes(data), repeats, warmup)))
+        rows.append(_row("pavement", size, 1, "preprocess", _measure(lambda: transform(pil_image), repeats, warmup)))
+
+        for batch_size in batch_sizes:
+            tensor = pavement._to_model_input(transform(pil_image).unsqueeze(0).repeat(batch_size, 1, 1, 1))
+
+            def forward():
+                with torch.no_grad():
+                    return model(tensor)
+
+            rows.append(_row("pavement", size, batch_size, "inference", _measure(forward, repeats, warmup)))
+            output = forward()
+            rows.append(_row("pavement", size, batch_size, "postprocess", _measure(
+                lambda: torch.max(torch.nn.functional.softmax(output.float(), dim=1), 1), repeats, warmup
+            )))
+            images = [image] * batch_size
+            rows.append(_row("pavement", size, batch_size, "classify_batch", _measure(
+                lambda: pavement.classify_pavement_batch(images, batch_size), repeats, warmup
+            )))
+
+        result = {}
+
+        def run_detect():
+            result["detections"] = pavement.detect_pavement_marking_array(image, "bench.jpg", render="none")[0]
+
+        rows.append(_row("pavement", size, 1, "detect", _measure(run_detect, repeats, warmup)))
+        label, confidence = result["detections"][0]["label"], result["detections"][0]["confidence"] * 100
+
+        def render():
+            canvas = pil_image.copy()
+            pavement._draw_classification_on_image(canvas, label, confidence)
+            canvas.save(io.BytesIO(), format="JPEG")
+
+        rows.append(_row("pavement", size, 1, "render", _measure(render, repeats, warmup)))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _environment(weights):
+    import torch
+    from detectors.cpu_quota import available_cpus
+
+    try:
+        import ultralytics
+        ultralytics_version = ultralytics.__version__
+    except Exception:
+        ultralytics_version = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git_commit(),
+        "weights": weights,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "ultralytics": ultralytics_version,
+        "opencv": cv2.__version__,
+        "cpus": available_cpus(),
+        "inference_backend": os.getenv("INFERENCE_BACKEND", "torch"),
+        "tiled_inference": os.getenv("TILED_INFERENCE", "off"),
+        "pavement_optimize": os.getenv("PAVEMENT_OPTIMIZE", "none"),
+    }
+
+
+def compare(rows, baseline_path, tolerance, min_delta_ms):
+    """Print stages whose median got slower than the baseline by more than ``tolerance`` (and ``min_delta_ms``)."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r["detector"], r["size"], r["batch_size"], r["stage"])
+    previous = {key(r): r for r in baseline.get("results", [])}
+
+    regressions = []
+    for row in rows:
+        old = previous.get(key(row))
+        if old is None or not old["median_ms"]:
+            continue
+        ratio = row["median_ms"] / old["median_ms"]
+        if ratio > 1 + tolerance and row["median_ms"] - old["median_ms"] > min_delta_ms:
+            regressions.append({**row, "baseline_median_ms": old["median_ms"], "ratio": round(ratio, 3)})
+
+    print(f"📊 Compared {len(rows)} stages against {baseline_path} (commit {baseline.get('environment', {}).get('git_commit')})")
+    for r in regressions:
+        print(f"⚠️ {r['detector']:<14} {r['size']:>10} bs={r['batch_size']:<3} {r['stage']:<16} "
+              f"{r['baseline_median_ms']:.2f} → {r['median_ms']:.2f} ms (x{r['ratio']})")
+    if not regressions:
+        print("✅ No regressions")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detector hot paths on CPU and write JSON results.")
+    parser.add_argument("--weights", choices=("auto", "stub", "real"), default="auto")
+    parser.add_argument("--detectors", default=",".join(DETECTORS), help="Comma-separated subset of: " + ", ".join(DETECTORS))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated WIDTHxHEIGHT image sizes")
+    parser.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES, help="Comma-separated model batch sizes")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a stage counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this (timer noise)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 when --compare finds regressions")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.detectors.split(",") if n.strip()]
+    unknown = [n for n in names if n not in DETECTORS]
+    if unknown:
+        parser.error(f"Unknown detectors: {unknown}. Choose from: {DETECTORS}")
+    sizes = _parse_sizes(args.sizes)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    repeats, warmup = max(1, args.repeats), max(0, args.warmup)
+
+    weights = _resolve_weights(args.weights)
+    print(f"🔍 Benchmarking {names} with {weights} weights, sizes={args.sizes}, batch sizes={batch_sizes}")
+
+    rows = []
+    for name in names:
+        start = time.perf_counter()
+        if name == "pavement":
+            rows.extend(bench_pavement(sizes, batch_sizes, repeats, warmup))
+        else:
+            rows.extend(bench_yolo(name, sizes, batch_sizes, repeats, warmup))
+        print(f"✅ {name} done in {time.perf_counter() - start:.1f}s")
+
+    report = {"environment": _environment(weights), "results": rows}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Wrote {len(rows)} results to {args.out}")
+
+    if args.compare:
+        regressions = compare(rows, args.compare, args.tolerance, args.min_delta_ms)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
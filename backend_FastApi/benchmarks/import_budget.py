@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Cold-start check: time `import model_api` in fresh interpreters and fail when it exceeds the budget
+# or pulls in the ML stack, which must only load on first use (see detectors/registry.py).
+#   python -m benchmarks.import_budget --budget-ms 1500
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+HEAVY_MODULES = ("torch", "torchvision", "ultralytics", "onnxruntime")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module="model_api", repeats=5):
+    """Import ``module`` in ``repeats`` fresh interpreters; returns per-run ms and the heavy modules it loaded."""
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return runs
+
+
+def slowest_imports(module="model_api", top=10):
+    """The ``top`` imports by cumulative time, from ``python -X importtime``."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time `import model_api` against a cold-start budget")
+    parser.add_argument("--module", default="model_api")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Show the N slowest imports (0 = skip)")
+    args = parser.parse_args(argv)
+
+    runs = measure(args.module, args.repeats)
+    times = sorted(r["ms"] for r in runs)
+    median = times[len(times) // 2]
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    print(f"📊 import {args.module}: median {median:.0f} ms, min {times[0]:.0f} ms, max {times[-1]:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if args.top:
+        for ms, name in slowest_imports(args.module, args.top):
+            print(f"   {ms:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"❌ import {args.module} loaded {heavy}; detector modules must be imported lazily")
+        failed = True
+    if median > args.budget_ms:
+        print(f"❌ import {args.module} took {median:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("✅ Within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import os
+import shutil
+import logging
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+YOLO_MODELS = ("traffic_light", "traffic_sign", "roadway_illumination", "traffic_sign_damage", "traffic_signal_damage")
+STUB_YOLO_CLASSES = 8
+
+
+def _stub_yolo(path, num_classes=STUB_YOLO_CLASSES, seed=0):
+    """
+    A randomly initialised YOLOv8n with the real architecture, so forward/NMS cost matches
+    a trained nano model. BatchNorm statistics are calibrated on smooth noise and the class
+    biases are spread out, so the stub emits a realistic number of boxes instead of none.
+    """
+    import torch
+    from ultralytics.nn.tasks import DetectionModel
+
+    torch.manual_seed(seed)
+    model = DetectionModel("yolov8n.yaml", nc=num_classes, verbose=False)
+    model.names = {i: f"stub{i}" for i in range(num_classes)}
+    head = model.model[-1]
+    for i in range(head.nl):
+        head.cv3[i][2].bias.data.normal_(-2.0, 0.5)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.momentum = None  # cumulative average over the calibration passes
+    model.train()
+    with torch.no_grad():
+        for _ in range(4):
+            model(torch.nn.functional.avg_pool2d(torch.rand(4, 3, 320, 320), 9, 1, 4))
+    model.eval()
+    torch.save({"model": model, "train_args": {}}, path)
+
+
+def _stub_fastcnn(path, seed=0):
+    import torch
+    from detectors.pavement_marking_detection import CLASS_NAMES, FastCNN
+
+    torch.manual_seed(seed)
+    torch.save(FastCNN(num_classes=len(CLASS_NAMES), image_size=128).state_dict(), path)
+
+
+def write_stub_models(directory):
+    """Write stub weights for every model in detectors/model_registry.py under ``directory``, named like the real files."""
+    from detectors.model_registry import MODEL_SPECS
+
+    os.makedirs(directory, exist_ok=True)
+    yolo_path = os.path.join(directory, MODEL_SPECS[YOLO_MODELS[0]].filename)
+    _stub_yolo(yolo_path)
+    for name in YOLO_MODELS[1:]:
+        shutil.copyfile(yolo_path, os.path.join(directory, MODEL_SPECS[name].filename))
+    _stub_fastcnn(os.path.join(directory, MODEL_SPECS["pavement_marking"].filename))
+    logger.info(f"✅ Wrote stub weights to {directory}")
+    return {name: os.path.join(directory, spec.filename) for name, spec in MODEL_SPECS.items()}
@@ -0,0 +1,289 @@
+import os
+import csv
+import time
+import tarfile
+import zipfile
+import logging
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+from detectors.image_io import SUPPORTED_FORMATS
+from detectors.ingest import UPLOAD_MAX_BYTES, UploadRejected
+from detectors.storage import scoped_filename
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = [".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz"]
+# Plain-text manifests: one image path per line, relative to (and confined to) ARCHIVE_ROOT
+MANIFEST_FORMATS = [".txt", ".lst"]
+ARCHIVE_MAX_BYTES = int(os.getenv("ARCHIVE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", "100000"))
+# Directory manifests may read from; unset = manifests are refused
+ARCHIVE_ROOT = os.getenv("ARCHIVE_ROOT", "")
+ARCHIVE_PROGRESS_SECONDS = float(os.getenv("ARCHIVE_PROGRESS_SECONDS", "2"))
+
+OUTPUT_FORMATS = ("csv", "parquet")
+# One row per detection, plus one row (with ``error``) per image that failed or detector that raised
+RESULT_COLUMNS = ["image", "detector", "label", "confidence", "x1", "y1", "x2", "y2", "image_width", "image_height", "error"]
+_PARQUET_ROW_GROUP = 10000
+
+
+def archive_kind(filename):
+    """"zip", "tar" or "manifest" from the upload's file name, else ValueError."""
+    name = (filename or "").lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if any(name.endswith(ext) for ext in ARCHIVE_FORMATS):
+        return "tar"
+    if any(name.endswith(ext) for ext in MANIFEST_FORMATS):
+        if not ARCHIVE_ROOT:
+            raise ValueError("Manifests are disabled: set ARCHIVE_ROOT to the directory they may read from")
+        return "manifest"
+    raise ValueError(f"Unsupported archive format: {os.path.basename(name)}. Supported formats: {ARCHIVE_FORMATS + MANIFEST_FORMATS}")
+
+
+def result_filename(filename, fmt):
+    """``survey.tar.gz`` -> ``survey_detections_<uuid>.csv``: the results file under output/."""
+    stem = os.path.basename(filename or "archive")
+    for ext in sorted(ARCHIVE_FORMATS + MANIFEST_FORMATS, key=len, reverse=True):
+        if stem.lower().endswith(ext):
+            stem = stem[: -len(ext)]
+            break
+    return scoped_filename(f"{stem}_detections.{fmt}")
+
+
+def check_output_format(fmt):
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}. Choose from {OUTPUT_FORMATS}")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except Exception as e:
+            raise ValueError(f"pyarrow not installed for Parquet output: {e}")
+    return fmt
+
+
+def _is_image(name):
+    base = os.path.basename(name)
+    return (
+        os.path.splitext(base)[1].lower() in SUPPORTED_FORMATS
+        and not base.startswith(".")  # macOS ._ resource forks, hidden files
+        and "__MACOSX/" not in name
+    )
+
+
+def _too_large():
+    return UploadRejected(413, f"Member larger than UPLOAD_MAX_BYTES ({UPLOAD_MAX_BYTES} bytes)")
+
+
+def _zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image(info.filename):
+                continue
+            if info.file_size > UPLOAD_MAX_BYTES:
+                yield info.filename, _too_large()
+                continue
+            if info.flag_bits & 0x1:
+                yield info.filename, UploadRejected(400, "Member is encrypted")
+                continue
+            try:
+                with archive.open(info) as f:
+                    yield info.filename, f.read(UPLOAD_MAX_BYTES + 1)  # the header's size isn't trusted
+            except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                yield info.filename, UploadRejected(400, f"Corrupt member: {e}")
+
+
+def _tar_members(path):
+    # "r|*": a forward-only stream, so compressed tars are never seeked or unpacked to disk
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not _is_image(member.name):
+                continue
+            if member.size > UPLOAD_MAX_BYTES:
+                yield member.name, _too_large()
+                continue
+            yield member.name, archive.extractfile(member).read()
+
+
+def _manifest_members(path, root):
+    root = os.path.realpath(root)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            full = os.path.realpath(os.path.join(root, entry))
+            if os.path.commonpath([full, root]) != root:
+                yield entry, UploadRejected(403, "Path is outside ARCHIVE_ROOT")
+                continue
+            try:
+                if os.path.getsize(full) > UPLOAD_MAX_BYTES:
+                    yield entry, _too_large()
+                    continue
+                with open(full, "rb") as image:
+                    yield entry, image.read(UPLOAD_MAX_BYTES + 1)
+            except OSError as e:
+                yield entry, UploadRejected(404, f"Cannot read {entry}: {e.strerror}")
+
+
+def count_members(path, kind):
+    """Number of image members, when it is cheap to know up front (zip central directory, manifest lines), else None."""
+    if kind == "zip":
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist() if not info.is_dir() and _is_image(info.filename))
+    if kind == "manifest":
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip() and not line.strip().startswith("#"))
+    return None
+
+
+def iter_members(path, kind, root=ARCHIVE_ROOT):
+    """
+    Yield ``(name, bytes or UploadRejected)`` for each image in an archive or manifest, one
+    member in memory at a time. Non-image members are skipped; oversized, encrypted or
+    unreadable ones come through as UploadRejected so they can be reported per image.
+    """
+    if kind == "zip":
+        members = _zip_members(path)
+    elif kind == "tar":
+        members = _tar_members(path)
+    else:
+        if not root:
+            raise ValueError("Manifests are disabled: set ARCHIVE_ROOT to the directory they may read from")
+        members = _manifest_members(path, root)
+    for count, member in enumerate(members):
+        if count >= ARCHIVE_MAX_MEMBERS:
+            logger.info(f"⚠️ Stopped after ARCHIVE_MAX_MEMBERS ({ARCHIVE_MAX_MEMBERS}) images")
+            break
+        yield member
+
+
+def detection_rows(image_name, sections, source_size=None):
+    """Result rows for one image from ``{detector: {"detections": [...]} or {"error": ...}}``."""
+    width, height = source_size or (None, None)
+    rows = []
+    for detector, section in sections.items():
+        if "error" in section:
+            rows.append({"image": image_name, "detector": detector, "error": section["error"]})
+            continue
+        for detection in section["detections"]:
+            x1, y1, x2, y2 = detection.get("bbox") or (None, None, None, None)
+            rows.append({
+                "image": image_name, "detector": detector, "label": detection.get("label"),
+                "confidence": detection.get("confidence"), "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                "image_width": width, "image_height": height,
+            })
+    return rows
+
+
+class ResultWriter:
+    """
+    Appends result rows to a CSV or Parquet file, flushing as it goes so memory stays flat.
+    ``append=True`` continues a CSV from a checkpoint (see jobs.py); Parquet can't be reopened.
+    """
+
+    def __init__(self, path, fmt, append=False):
+        self.path = path
+        self.format = check_output_format(fmt)
+        self.rows = 0
+        self._buffer = []
+        if fmt == "csv":
+            self._file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+            if not append:
+                self._csv.writeheader()
+        elif append:
+            raise ValueError("Parquet results can't be appended to; use csv")
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self._schema = pa.schema([
+                ("image", pa.string()), ("detector", pa.string()), ("label", pa.string()),
+                ("confidence", pa.float64()), ("x1", pa.int64()), ("y1", pa.int64()),
+                ("x2", pa.int64()), ("y2", pa.int64()), ("image_width", pa.int64()),
+                ("image_height", pa.int64()), ("error", pa.string()),
+            ])
+            self._parquet = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        self.rows += len(rows)
+        if self.format == "csv":
+            self._csv.writerows(rows)
+            return
+        self._buffer.extend(rows)
+        if len(self._buffer) >= _PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            import pyarrow as pa
+
+            columns = {c: [row.get(c) for row in self._buffer] for c in RESULT_COLUMNS}
+            self._parquet.write_table(pa.table(columns, schema=self._schema))
+            self._buffer = []
+
+    def checkpoint(self):
+        """Flush the CSV to disk and return its size: everything written so far survives a crash."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self.format == "csv":
+            self._file.close()
+        else:
+            self._flush()
+            self._parquet.close()
+
+
+def process_members(members, analyze, writer, workers=1, submit=None, progress_seconds=ARCHIVE_PROGRESS_SECONDS):
+    """
+    Run ``analyze(name, data) -> (rows, ok)`` (decode, inference, postprocess) over
+    ``members`` and write the rows in member order. ``submit(fn, *args) -> Future`` runs
+    the work, e.g. on a shared bounded executor; without it a private pool of ``workers``
+    threads does. At most two members per worker are in flight, so memory doesn't grow
+    with the archive. A generator: yields progress dicts every ``progress_seconds`` and the
+    final counts (with ``"done": True``) last.
+    """
+    workers = max(1, workers)
+    stats = {"processed": 0, "failed": 0, "rows": 0}
+    start = last = time.perf_counter()
+
+    def progress():
+        elapsed = time.perf_counter() - start
+        return {
+            **stats,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "images_per_second": round(stats["processed"] / elapsed, 2) if elapsed else None,
+        }
+
+    def collect(future):
+        rows, ok = future.result()
+        writer.write(rows)
+        stats["processed"] += 1
+        stats["failed"] += 0 if ok else 1
+        stats["rows"] = writer.rows
+
+    pending = deque()
+    with ExitStack() as stack:
+        if submit is None:
+            submit = stack.enter_context(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive")).submit
+        try:
+            for name, data in members:
+                pending.append(submit(analyze, name, data))
+                while len(pending) >= 2 * workers:
+                    collect(pending.popleft())
+                if time.perf_counter() - last >= progress_seconds:
+                    last = time.perf_counter()
+                    yield progress()
+            while pending:
+                collect(pending.popleft())
+        finally:
+            for future in pending:  # stopped early (client gone, error): drop queued work
+                future.cancel()
+    yield {**progress(), "done": True}
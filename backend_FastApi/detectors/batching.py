@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per model with <PREFIX>_BATCH_MAX_SIZE / <PREFIX>_BATCH_MAX_WAIT_MS
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+class _Pending:
+    __slots__ = ("image", "key", "future", "enqueued_at")
+
+    def __init__(self, image, key):
+        self.image = image
+        self.key = key
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects frames for one model from concurrent callers and runs them as a
+    single batched forward pass.
+
+    A batch is flushed once ``max_batch_size`` frames with the same
+    (conf, iou) are waiting or the oldest one has waited ``max_wait_ms``. A lone
+    frame runs at once: frames arriving while it runs form the next batch.
+    ``predict_fn(images, conf, iou)`` must return one result per image, in order;
+    any other count fails the whole batch.
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = []
+        self._cond = threading.Condition()
+        self._worker = None
+        # One forward pass at a time on the model: direct calls (batching disabled), the worker's
+        # batches and warm-ups all take it
+        self._forward_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._batch_size_hist = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._forward_total = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_batch_size > 1
+
+    def predict(self, image, conf, iou):
+        """Run one frame through the model, batched with concurrent callers when enabled."""
+        if not self.enabled:
+            with self._forward_lock:
+                start = time.perf_counter()
+                result = self.predict_fn([image], conf, iou)[0]
+                self._record([0.0], time.perf_counter() - start)
+            return result
+        return self.submit(image, conf, iou).result()
+
+    def warmup(self, image, conf, iou):
+        """
+        One forward pass on the calling thread, serialized with requests but left out of the
+        stats. Starts no worker thread, so serve.py can warm up before forking.
+        """
+        with self._forward_lock:
+            self.predict_fn([image], conf, iou)
+
+    def submit(self, image, conf, iou):
+        return self.submit_many([image], conf, iou)[0]
+
+    def submit_many(self, images, conf, iou):
+        """Queue several frames at once (e.g. one frame's tiles), so the first isn't dispatched alone."""
+        pending = [_Pending(image, (conf, iou)) for image in images]
+        with self._cond:
+            self._ensure_worker()
+            self._queue.extend(pending)
+            self._cond.notify()
+        return [p.future for p in pending]
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+            self._worker.start()
+
+    def _take_batch(self):
+        """Block until a batch is due, then pop it from the queue (called with the condition held)."""
+        while not self._queue:
+            self._cond.wait()
+
+        key = self._queue[0].key
+        deadline = self._queue[0].enqueued_at + self.max_wait
+        while True:
+            same_key = [p for p in self._queue if p.key == key]
+            remaining = deadline - time.perf_counter()
+            if len(same_key) >= self.max_batch_size or remaining <= 0 or len(self._queue) == 1:
+                break
+            self._cond.wait(remaining)
+
+        batch = same_key[:self.max_batch_size]
+        taken = set(map(id, batch))
+        self._queue = [p for p in self._queue if id(p) not in taken]
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+
+            started = time.perf_counter()
+            waits = [started - p.enqueued_at for p in batch]
+            conf, iou = batch[0].key
+            try:
+                with self._forward_lock:
+                    results = list(self.predict_fn([p.image for p in batch], conf, iou))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{len(results)} results for a batch of {len(batch)} frames")
+            except Exception as e:
+                logger.error(f"❌ Batched inference failed for {self.name}: {e}")
+                for p in batch:
+                    p.future.set_exception(e)
+                continue
+
+            self._record(waits, time.perf_counter() - started)
+            for p, result in zip(batch, results):
+                p.future.set_result(result)
+
+    def _record(self, waits, forward_seconds):
+        size = len(waits)
+        with self._stats_lock:
+            self._batches += 1
+            self._frames += size
+            self._batch_size_hist[size] = self._batch_size_hist.get(size, 0) + 1
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._forward_total += forward_seconds
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches or 1
+            frames = self._frames or 1
+            return {
+                "enabled": self.enabled,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "queued": len(self._queue),
+                "batches": self._batches,
+                "frames": self._frames,
+                "avg_batch_size": round(self._frames / batches, 3),
+                "batch_size_histogram": dict(sorted(self._batch_size_hist.items())),
+                "avg_queue_wait_ms": round(self._wait_total / frames * 1000, 3),
+                "max_queue_wait_ms": round(self._wait_max * 1000, 3),
+                "avg_forward_ms": round(self._forward_total / batches * 1000, 3),
+            }
+
+
+def get_batcher(name, predict_fn, env_prefix):
+    """Return the process-wide batcher for a model, creating it from env config on first use."""
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                max_size = int(os.getenv(f"{env_prefix}_BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE))
+                max_wait = float(os.getenv(f"{env_prefix}_BATCH_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+                batcher = MicroBatcher(name, predict_fn, max_size, max_wait)
+                _batchers[name] = batcher
+                logger.info(f"✅ Batcher for {name}: max_batch_size={max_size}, max_wait_ms={max_wait}")
+    return batcher
+
+
+def batching_stats():
+    """Batch-size and queue-wait stats for every model that has served a request."""
+    with _batchers_lock:
+        return {name: b.stats() for name, b in _batchers.items()}
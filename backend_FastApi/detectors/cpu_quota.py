@@ -0,0 +1,48 @@
+import os
+import math
+
+# Set in forked serving workers (see serve.py) to this process's share of the quota
+_worker_cpus = None
+
+
+def available_cpus():
+    """
+    CPUs this process may actually use: the cgroup CPU quota when one is set (k8s
+    `limits.cpu`), else the affinity mask. os.cpu_count() reports the whole node,
+    which oversubscribes thread pools in a 1-CPU pod.
+    """
+    if _worker_cpus:
+        return _worker_cpus
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            value, period = f.read().split()[:2]
+        if value != "max":
+            quota = int(value) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                value = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if value > 0:
+                quota = value / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def set_worker_cpus(cpus):
+    """Cap available_cpus() at ``cpus`` for this process, e.g. one worker's share when several share the quota."""
+    global _worker_cpus
+    _worker_cpus = max(1, int(cpus)) if cpus else None
@@ -0,0 +1,219 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import logging
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Every detection from a geotagged upload (EXIF GPS, see detectors/geotag.py) is kept in SQLite
+# with the camera position, indexed by an R*Tree for /detections?bbox= viewport queries.
+# Images without GPS aren't stored. DETECTION_STORE=0 turns it off.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DETECTION_STORE = os.getenv("DETECTION_STORE", "1") == "1"
+DETECTIONS_DB = os.getenv("DETECTIONS_DB", os.path.join(BASE_DIR, "data", "detections.db"))
+# Most rows one /detections query returns; larger viewports come back truncated
+DETECTIONS_QUERY_LIMIT = int(os.getenv("DETECTIONS_QUERY_LIMIT", "5000"))
+_FLUSH_ROWS = 1000
+_FLUSH_SECONDS = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    image_digest TEXT NOT NULL,
+    image_name TEXT,
+    detector TEXT NOT NULL,
+    label TEXT,
+    confidence REAL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    heading REAL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    created_at REAL NOT NULL
+);
+-- Points stored as degenerate boxes; the detector is an auxiliary column so a ?type= filter
+-- never has to touch the detections table for rows it rejects
+CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree USING rtree(id, min_lng, max_lng, min_lat, max_lat, +detector TEXT);
+-- (image, detector) pairs already stored: re-submitted images (result cache hits) aren't duplicated
+CREATE TABLE IF NOT EXISTS stored_images (
+    digest TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    PRIMARY KEY (digest, detector)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_counters = {"images_stored": 0, "images_duplicate": 0, "images_without_gps": 0, "detections_stored": 0, "write_errors": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(**deltas):
+    with _counters_lock:
+        for name, delta in deltas.items():
+            _counters[name] += delta
+
+
+def _connect():
+    """One connection per thread; WAL so viewport queries don't wait on the writer."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(DETECTIONS_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(DETECTIONS_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(_SCHEMA)
+                _initialized = True
+        _local.conn = conn
+    return conn
+
+
+def _write(batch):
+    conn = _connect()
+    stored = duplicate = rows = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for digest, image_name, detector, (lat, lng, heading), detections, created_at in batch:
+            cursor = conn.execute("INSERT OR IGNORE INTO stored_images (digest, detector) VALUES (?, ?)", (digest, detector))
+            if not cursor.rowcount:
+                duplicate += 1
+                continue
+            stored += 1
+            for detection in detections:
+                x1, y1, x2, y2 = detection.get("bbox") or (None, None, None, None)
+                cursor = conn.execute(
+                    "INSERT INTO detections (image_digest, image_name, detector, label, confidence, lat, lng, heading, x1, y1, x2, y2, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, image_name, detector, detection.get("label"), detection.get("confidence"), lat, lng, heading, x1, y1, x2, y2, created_at),
+                )
+                conn.execute(
+                    "INSERT INTO detections_rtree (id, min_lng, max_lng, min_lat, max_lat, detector) VALUES (?, ?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, lng, lng, lat, lat, detector),
+                )
+                rows += 1
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _count(images_stored=stored, images_duplicate=duplicate, detections_stored=rows)
+
+
+def _write_forever():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + _FLUSH_SECONDS
+        while len(batch) < _FLUSH_ROWS:
+            try:
+                batch.append(_queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        stop = None in batch
+        batch = [item for item in batch if item is not None]
+        try:
+            if batch:
+                _write(batch)
+        except Exception as e:
+            logger.error(f"❌ Failed to store {len(batch)} detection sets: {e}")
+            _count(write_errors=len(batch))
+        finally:
+            for _ in range(len(batch) + stop):
+                _queue.task_done()
+        if stop:
+            return
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_forever, name="detection-store", daemon=True)
+                _writer.start()
+
+
+def record_detections(upload, detector, detections, image_name=None):
+    """
+    Queue one detector's detections on ``upload`` for storage at its GPS position. Returns at
+    once; a background thread writes them in batched transactions off the request path.
+    """
+    if not DETECTION_STORE:
+        return
+    if upload.location is None:
+        _count(images_without_gps=1)
+        return
+    _ensure_writer()
+    _queue.put((upload.digest, image_name or upload.filename, detector, upload.location, detections, time.time()))
+
+
+def flush_store():
+    """Block until every queued detection is written (shutdown, tests, benchmarks)."""
+    if _writer is not None:
+        _queue.join()
+
+
+def shutdown_store():
+    global _writer
+    if _writer is not None:
+        _queue.put(None)
+        _writer.join(timeout=30)
+        _writer = None
+
+
+def query_detections(bbox, detectors=None, labels=None, min_confidence=None, limit=DETECTIONS_QUERY_LIMIT):
+    """
+    Detections inside ``bbox`` = (min_lng, min_lat, max_lng, max_lat), optionally only from
+    ``detectors`` / with ``labels`` / above ``min_confidence``. Returns ``(rows, truncated)``
+    with at most ``limit`` rows, found through the R*Tree rather than a table scan.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    # The R*Tree stores 32-bit floats rounded outwards, so re-check the exact coordinates
+    where = [
+        "r.min_lng <= ? AND r.max_lng >= ? AND r.min_lat <= ? AND r.max_lat >= ?",
+        "d.lng BETWEEN ? AND ? AND d.lat BETWEEN ? AND ?",
+    ]
+    args = [max_lng, min_lng, max_lat, min_lat, min_lng, max_lng, min_lat, max_lat]
+    if detectors:
+        where.append(f"r.detector IN ({', '.join('?' * len(detectors))})")
+        args.extend(detectors)
+    if labels:
+        where.append(f"d.label IN ({', '.join('?' * len(labels))})")
+        args.extend(labels)
+    if min_confidence is not None:
+        where.append("d.confidence >= ?")
+        args.append(min_confidence)
+    rows = _connect().execute(
+        "SELECT d.id, d.detector, d.label, d.confidence, d.lat, d.lng, d.heading, d.image_digest, d.image_name, "
+        "d.x1, d.y1, d.x2, d.y2, d.created_at "
+        "FROM detections_rtree r JOIN detections d ON d.id = r.id "
+        f"WHERE {' AND '.join(where)} LIMIT ?",
+        (*args, limit + 1),
+    ).fetchall()
+    detections = [
+        {
+            "id": row["id"], "type": row["detector"], "label": row["label"], "confidence": row["confidence"],
+            "lat": row["lat"], "lng": row["lng"], "heading": row["heading"],
+            "image": row["image_name"], "image_digest": row["image_digest"],
+            "bbox": None if row["x1"] is None else [row["x1"], row["y1"], row["x2"], row["y2"]],
+            "created_at": row["created_at"],
+        }
+        for row in rows[:limit]
+    ]
+    return detections, len(rows) > limit
+
+
+def store_stats():
+    with _counters_lock:
+        stats = dict(_counters)
+    stats.update(enabled=DETECTION_STORE, queued=_queue.qsize())
+    return stats
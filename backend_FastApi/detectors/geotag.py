@@ -0,0 +1,99 @@
+import struct
+
+from detectors.image_io import JPEG_SIGNATURE, jpeg_segments
+
+_EXIF_HEADER = b"Exif\x00\x00"
+_GPS_IFD_POINTER = 0x8825
+# GPS IFD tags
+_LAT_REF, _LAT, _LNG_REF, _LNG = 1, 2, 3, 4
+_TRACK, _IMG_DIRECTION = 15, 17
+# TIFF field types -> size in bytes
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+
+def _exif_tiff(data):
+    """The TIFF block of a JPEG's EXIF APP1 segment, or None."""
+    if not data.startswith(JPEG_SIGNATURE):
+        return None
+    for marker, i in jpeg_segments(data):
+        if marker == 0xE1:
+            length = int.from_bytes(data[i + 2:i + 4], "big")
+            segment = data[i + 4:i + 2 + length]
+            if segment.startswith(_EXIF_HEADER):
+                return segment[len(_EXIF_HEADER):]
+    return None
+
+
+def _read_ifd(tiff, offset, order):
+    """``{tag: (type, count, value bytes)}`` for one IFD; malformed entries are skipped."""
+    entries = {}
+    if offset + 2 > len(tiff):
+        return entries
+    (count,) = struct.unpack_from(order + "H", tiff, offset)
+    for n in range(count):
+        entry = offset + 2 + n * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, kind, values = struct.unpack_from(order + "HHI", tiff, entry)
+        size = _TYPE_SIZES.get(kind, 0) * values
+        if size <= 4:
+            value = tiff[entry + 8:entry + 8 + size]
+        else:
+            (pointer,) = struct.unpack_from(order + "I", tiff, entry + 8)
+            value = tiff[pointer:pointer + size]
+        if len(value) == size:
+            entries[tag] = (kind, values, value)
+    return entries
+
+
+def _rationals(entry, order):
+    kind, count, value = entry
+    if kind not in (5, 10):
+        return None
+    fmt = order + ("I" if kind == 5 else "i") * (2 * count)
+    parts = struct.unpack(fmt, value)
+    return [num / den if den else None for num, den in zip(parts[::2], parts[1::2])]
+
+
+def _degrees(entry, ref, order):
+    parts = _rationals(entry, order)
+    if not parts or None in parts:
+        return None
+    degrees = parts[0] + (parts[1] if len(parts) > 1 else 0) / 60 + (parts[2] if len(parts) > 2 else 0) / 3600
+    return -degrees if ref in (b"S", b"W") else degrees
+
+
+def read_location(data):
+    """
+    ``(lat, lng, heading)`` from a JPEG's EXIF GPS tags, or None when it has none. The heading
+    (degrees from north) is the camera direction, else the direction of travel, else None.
+    Only the header segments are parsed; the pixels are never touched.
+    """
+    try:
+        tiff = _exif_tiff(data)
+        if tiff is None or tiff[:2] not in (b"II", b"MM"):
+            return None
+        order = "<" if tiff[:2] == b"II" else ">"
+        (ifd0,) = struct.unpack_from(order + "I", tiff, 4)
+        pointer = _read_ifd(tiff, ifd0, order).get(_GPS_IFD_POINTER)
+        if pointer is None:
+            return None
+        (gps_offset,) = struct.unpack_from(order + "I", pointer[2].ljust(4, b"\0"))
+        gps = _read_ifd(tiff, gps_offset, order)
+        if _LAT not in gps or _LNG not in gps:
+            return None
+        lat = _degrees(gps[_LAT], gps.get(_LAT_REF, (0, 0, b""))[2][:1], order)
+        lng = _degrees(gps[_LNG], gps.get(_LNG_REF, (0, 0, b""))[2][:1], order)
+    except struct.error:
+        return None
+    # 0,0 is what cameras write without a fix
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None
+    heading = None
+    for tag in (_IMG_DIRECTION, _TRACK):
+        if tag in gps:
+            parts = _rationals(gps[tag], order)
+            if parts and parts[0] is not None:
+                heading = parts[0] % 360
+                break
+    return round(lat, 7), round(lng, 7), None if heading is None else round(heading, 2)
@@ -0,0 +1,131 @@
+import os
+import cv2
+import numpy as np
+
+SUPPORTED_FORMATS = [".jpg", ".jpeg", ".png"]
+
+# Match PIL's Image.open(...).convert("RGB"), which ignores the EXIF orientation tag,
+# so bounding boxes stay in the same coordinate space as before.
+_IMREAD_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+# Decode large JPEGs at 1/2, 1/4 or 1/8 scale in the DCT domain (libjpeg scale factors) when the
+# model would downscale them anyway; 0 = always decode at full resolution
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "1") == "1"
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+# Start-of-frame markers carrying the image size (all SOFn except DHT, JPG and DAC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def check_supported_format(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported image format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
+    return ext
+
+
+def decode_image_bytes(data):
+    """Decode encoded JPEG/PNG bytes straight into a BGR uint8 array, without touching disk."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buf, _IMREAD_FLAGS) if buf.size else None
+    if image is None:
+        raise ValueError("Failed to open image: could not decode image data")
+    return image
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+
+def sniff_format(data):
+    """"jpeg" or "png" from the magic bytes at the start of ``data``, else None."""
+    if data[:3] == JPEG_SIGNATURE:
+        return "jpeg"
+    if data[:8] == PNG_SIGNATURE:
+        return "png"
+    return None
+
+
+def jpeg_segments(data):
+    """``(marker, offset)`` of each JPEG marker segment, up to and including the first scan (SOS)."""
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers, no length
+            i += 2
+            continue
+        yield marker, i
+        if marker in (0xD9, 0xDA):  # end of image / start of scan
+            return
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+
+
+def image_size(data):
+    """
+    ``(width, height)`` from a JPEG SOF or PNG IHDR header without decoding pixels, or None
+    if not found. ``data`` may be just the start of the file (the header comes first).
+    """
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR" and len(data) >= 24:
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data[:2] != b"\xff\xd8":
+        return None
+    for marker, i in jpeg_segments(data):
+        if marker in _JPEG_SOF and i + 9 <= len(data):
+            return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+    return None
+
+
+def is_complete(data):
+    """Whether a JPEG has an end-of-image marker after its first scan, or a PNG its IEND chunk (not truncated)."""
+    if data[:8] == PNG_SIGNATURE:
+        return data.rfind(b"IEND") > 8
+    for marker, i in jpeg_segments(data):
+        if marker == 0xDA:
+            return data.rfind(b"\xff\xd9") > i
+    return False
+
+
+def reduced_factor(size, min_long_side=0, min_short_side=0):
+    """Largest libjpeg reduction (8, 4, 2, else 1) whose output keeps at least ``min_long_side`` / ``min_short_side`` pixels."""
+    width, height = size
+    for factor in (8, 4, 2):
+        w, h = -(-width // factor), -(-height // factor)  # libjpeg rounds scaled sizes up
+        if max(w, h) >= min_long_side and min(w, h) >= min_short_side:
+            return factor
+    return 1
+
+
+def decode_reduced(data, min_long_side=0, min_short_side=0):
+    """
+    Like decode_image_bytes, but a JPEG big enough is decoded straight at a 1/2, 1/4 or 1/8
+    scale that still gives the model at least ``min_long_side`` / ``min_short_side`` pixels,
+    which skips most of the IDCT work and the full-size buffer. Returns ``(image, source_size)``
+    with the ``(width, height)`` of the full-resolution image, to map boxes back to it.
+    """
+    size = image_size(data) if REDUCED_DECODE and sniff_format(data) == "jpeg" else None
+    factor = reduced_factor(size, min_long_side, min_short_side) if size and (min_long_side or min_short_side) else 1
+    if factor == 1:
+        image = decode_image_bytes(data)
+        return image, (image.shape[1], image.shape[0])
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _REDUCED_FLAGS[factor])
+    if image is None:
+        raise ValueError("Failed to open image: could not decode image data")
+    return image, size
+
+
+def load_image(image_path):
+    """Read an image file into a BGR uint8 array (path-based counterpart of decode_image_bytes)."""
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise ValueError(f"Failed to open image: {e}")
+    return decode_image_bytes(data)
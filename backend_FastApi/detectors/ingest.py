@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+
+from detectors.geotag import read_location
+from detectors.image_io import SUPPORTED_FORMATS, image_size, is_complete, sniff_format
+
+# Upload guards, checked before any decode or model work. Starlette's multipart parser has
+# spooled the whole file before a handler runs, so only BodyLimitMiddleware (model_api.py)
+# stops an upload while it streams in; the checks below keep bad files away from the models:
+#   UPLOAD_MAX_BYTES - largest accepted image file (413 beyond it)
+#   MAX_IMAGE_PIXELS - largest width x height from the image header (413 beyond it; PIL's
+#                      decompression-bomb default), so a small file can't expand into a huge bitmap
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "89478485"))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Multipart boundaries and part headers on top of the file bytes
+MULTIPART_OVERHEAD = 64 * 1024
+# A JPEG's SOF comes after its APPn segments (EXIF, ICC, XMP); past this much data without it, give up
+_HEADER_MAX_BYTES = 1024 * 1024
+
+
+class UploadRejected(ValueError):
+    """An upload failed an ingestion check; the caller should answer ``status_code`` with the message."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Upload:
+    """
+    One image upload that passed the checks: its bytes, SHA-256, sniffed format, header size
+    and EXIF GPS ``location`` as ``(lat, lng, heading)`` (None when not geotagged).
+    """
+
+    __slots__ = ("filename", "data", "digest", "format", "width", "height", "location")
+
+    def __init__(self, filename, data, digest, fmt, width, height):
+        self.filename = filename
+        self.data = data
+        self.digest = digest
+        self.format = fmt
+        self.width = width
+        self.height = height
+        self.location = read_location(data)
+
+
+def _check_extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in SUPPORTED_FORMATS:
+        raise UploadRejected(415, f"Unsupported image format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
+
+
+def _check_size(size, max_pixels):
+    width, height = size
+    if not width or not height:
+        raise UploadRejected(400, "Invalid image: zero width or height in header")
+    if width * height > max_pixels:
+        raise UploadRejected(413, f"Image is {width}x{height} pixels, over MAX_IMAGE_PIXELS ({max_pixels})")
+
+
+def inspect_image(filename, data, max_bytes=UPLOAD_MAX_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """The read_image_upload checks for bytes already in memory, e.g. an archive member. Returns an Upload."""
+    _check_extension(filename)
+    if not data:
+        raise UploadRejected(400, "Empty upload")
+    if len(data) > max_bytes:
+        raise UploadRejected(413, f"Upload larger than UPLOAD_MAX_BYTES ({max_bytes} bytes)")
+    fmt = sniff_format(data)
+    if fmt is None:
+        raise UploadRejected(415, "File content is not a JPEG or PNG image")
+    size = image_size(data[:_HEADER_MAX_BYTES])
+    if size is None:
+        raise UploadRejected(400, "Invalid image: could not read its dimensions from the header")
+    _check_size(size, max_pixels)
+    if not is_complete(data):
+        raise UploadRejected(400, "Invalid image: file is truncated")
+    return Upload(filename, data, hashlib.sha256(data).hexdigest(), fmt, *size)
+
+
+async def read_image_upload(file, max_bytes=UPLOAD_MAX_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Read an UploadFile in chunks, hashing as it goes. The magic bytes are checked on the
+    first chunk and the header's dimensions as soon as they arrive, so a non-image or a
+    decompression bomb is rejected (UploadRejected) without copying the rest into memory.
+    The file has already been received and spooled by then: the body size limit while
+    streaming is BodyLimitMiddleware's job. Truncated files are rejected once complete.
+    Returns an Upload.
+    """
+    _check_extension(file.filename)
+    digest = hashlib.sha256()
+    chunks, header, received = [], b"", 0
+    fmt = size = None
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadRejected(413, f"Upload larger than UPLOAD_MAX_BYTES ({max_bytes} bytes)")
+        digest.update(chunk)
+        chunks.append(chunk)
+        if size is None and len(header) < _HEADER_MAX_BYTES:
+            header += chunk
+            if fmt is None and len(header) >= 8:
+                fmt = sniff_format(header)
+                if fmt is None:
+                    raise UploadRejected(415, "File content is not a JPEG or PNG image")
+            size = image_size(header) if fmt else None
+            if size is not None:
+                _check_size(size, max_pixels)
+
+    if not received:
+        raise UploadRejected(400, "Empty upload")
+    if fmt is None:
+        raise UploadRejected(415, "File content is not a JPEG or PNG image")
+    if size is None:
+        raise UploadRejected(400, "Invalid image: could not read its dimensions from the header")
+    data = b"".join(chunks)
+    if not is_complete(data):
+        raise UploadRejected(400, "Invalid image: file is truncated")
+    return Upload(file.filename, data, digest.hexdigest(), fmt, *size)
+
+
+class BodyLimitMiddleware:
+    """
+    ASGI middleware answering 413 when a request body is larger than its route's limit:
+    up front from Content-Length, or while streaming a body without one, so an oversized
+    upload is never spooled to disk. ``limits`` maps paths to byte limits; other
+    POST/PUT/PATCH requests get ``default``.
+    """
+
+    def __init__(self, app, default, limits=None):
+        self.app = app
+        self.default = default
+        self.limits = limits or {}
+
+    async def _reject(self, send, limit):
+        body = json.dumps({"error": f"Request body larger than {limit} bytes"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(scope["path"], self.default)
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await self._reject(send, limit)
+            return
+
+        state = {"received": 0, "exceeded": False, "started": False}
+
+        async def limited_receive():
+            if state["exceeded"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    return {"type": "http.disconnect"}  # stops the body parser
+            return message
+
+        async def guarded_send(message):
+            if state["exceeded"]:
+                # Replace whatever error the app produced for the cut-off body with the 413
+                if message["type"] == "http.response.start" and not state["started"]:
+                    state["started"] = True
+                    await self._reject(send, limit)
+                return
+            state["started"] = state["started"] or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not state["exceeded"]:
+                raise
+            if not state["started"]:
+                state["started"] = True
+                await self._reject(send, limit)
@@ -0,0 +1,53 @@
+import os
+import cv2
+import numpy as np
+
+# Inference size used by the YOLO detectors (ultralytics' default predict imgsz)
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))
+YOLO_STRIDE = 32
+
+
+class Letterboxed:
+    """A letterboxed copy of an image plus what is needed to map boxes back onto the original."""
+
+    __slots__ = ("image", "orig_shape", "gain", "pad")
+
+    def __init__(self, image, orig_shape):
+        self.image = image
+        self.orig_shape = orig_shape
+        # Same arithmetic as ultralytics.utils.ops.scale_boxes, so boxes match what
+        # model(original_image) reports to the pixel.
+        h1, w1 = image.shape[:2]
+        h0, w0 = orig_shape[:2]
+        self.gain = min(h1 / h0, w1 / w0)
+        self.pad = (round((w1 - w0 * self.gain) / 2 - 0.1), round((h1 - h0 * self.gain) / 2 - 0.1))
+
+    def to_original(self, xyxy):
+        """Map [x1, y1, x2, y2] box(es) from letterboxed to original image coordinates."""
+        boxes = np.array(xyxy, dtype=np.float32).reshape(-1, 4)
+        boxes[:, [0, 2]] -= self.pad[0]
+        boxes[:, [1, 3]] -= self.pad[1]
+        boxes /= self.gain
+        h, w = self.orig_shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        return boxes[0] if np.ndim(xyxy) == 1 else boxes
+
+
+def letterbox(image, new_shape=YOLO_IMGSZ, stride=YOLO_STRIDE, color=(114, 114, 114)):
+    """
+    Resize and pad a BGR image the same way ultralytics' LetterBox(auto=True) does for
+    predict(), so feeding the result to a YOLO model gives identical detections while
+    the resize is done once and shared between models.
+    """
+    h, w = image.shape[:2]
+    r = min(new_shape / h, new_shape / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw = (new_shape - new_unpad[0]) % stride / 2
+    dh = (new_shape - new_unpad[1]) % stride / 2
+
+    resized = image if (w, h) == new_unpad else cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return Letterboxed(padded, image.shape)
@@ -0,0 +1,320 @@
+import os
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Prometheus text-format metrics without the prometheus_client dependency. Recording is a
+# dict lookup plus a bisect under a per-metric lock, cheap enough to leave on under load;
+# METRICS_ENABLED=0 turns every record call into a no-op.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+# Seconds; stage timings span ~0.1 ms (postprocess) to tens of seconds (tiled frames, model loads)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Request labels, set per request by MetricsMiddleware and per detector by detector_scope;
+# inference_executor copies them into its worker threads
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="")
+_detector = contextvars.ContextVar("metrics_detector", default="")
+_request_start = contextvars.ContextVar("metrics_request_start", default=None)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # le is inclusive
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REQUESTS = Counter("asset_requests_total", "HTTP requests by endpoint and status code", ("endpoint", "status"))
+ERRORS = Counter("asset_request_errors_total", "Requests answered with a 5xx status or an unhandled exception", ("endpoint", "status"))
+IN_FLIGHT = Gauge("asset_requests_in_flight", "Requests currently being served (streams count until their last byte)", ("endpoint",))
+REQUEST_SECONDS = Histogram("asset_request_duration_seconds", "End-to-end request latency", ("endpoint",))
+STAGE_SECONDS = Histogram(
+    "asset_stage_duration_seconds",
+    "Latency per processing stage (upload, temp_write, decode, preprocess, batch_wait, forward, postprocess, draw, encode_write)",
+    ("endpoint", "detector", "stage"),
+)
+MODEL_LOADS = Counter("asset_model_loads_total", "Model load attempts", ("model", "status"))
+MODEL_LOAD_SECONDS = Histogram("asset_model_load_duration_seconds", "Model load time, including download and export", ("model",))
+MODEL_MEMORY = Gauge("asset_model_memory_bytes", "Weight memory of each loaded model (ONNX: graph file size)", ("model",))
+
+
+def observe_stage(stage, seconds, detector=None, endpoint=None):
+    """Record one stage timing, labelled with the current request's endpoint and detector unless given."""
+    STAGE_SECONDS.observe(
+        seconds,
+        endpoint=_endpoint.get() if endpoint is None else endpoint,
+        detector=_detector.get() if detector is None else detector,
+        stage=stage,
+    )
+
+
+def observe_upload():
+    """Record the time from the request's first byte until its upload has been read in full."""
+    start = _request_start.get()
+    if start is not None:
+        observe_stage("upload", time.perf_counter() - start, detector="")
+
+
+@contextmanager
+def stage_timer(stage, detector=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, detector)
+
+
+@contextmanager
+def detector_scope(name):
+    """Label stage timings recorded in this block (and threads it hands work to) with detector ``name``."""
+    token = _detector.set(name)
+    try:
+        yield
+    finally:
+        _detector.reset(token)
+
+
+def record_inference(result, predict_seconds, postprocess_seconds=0.0):
+    """
+    Split a YOLO ``batcher.predict`` call into stages. ultralytics (and the ONNX backend)
+    report per-image preprocess / inference / postprocess times in ``result.speed``; the
+    remainder of the call is time spent waiting for, or sharing, a micro-batch.
+    ``postprocess_seconds`` is the detector's own loop over the boxes.
+    """
+    speed = getattr(result, "speed", None)
+    if not speed or speed.get("inference") is None:
+        observe_stage("forward", predict_seconds)
+        observe_stage("postprocess", postprocess_seconds)
+        return
+    pre, forward, post = (speed.get(k) or 0.0 for k in ("preprocess", "inference", "postprocess"))
+    observe_stage("preprocess", pre / 1000)
+    observe_stage("forward", forward / 1000)
+    observe_stage("postprocess", post / 1000 + postprocess_seconds)
+    observe_stage("batch_wait", max(0.0, predict_seconds - (pre + forward + post) / 1000))
+
+
+def model_memory_bytes(model):
+    """Parameter + buffer bytes of a torch model (ultralytics YOLO wraps one in ``.model``), or an ONNX graph's file size."""
+    onnx_path = getattr(model, "onnx_path", None)
+    if onnx_path:
+        return os.path.getsize(onnx_path)
+    module = getattr(model, "model", model)
+    if not hasattr(module, "parameters"):
+        return None
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) or None  # frozen TorchScript hides its weights
+
+
+_load_listeners = []
+
+
+def add_model_load_listener(listener):
+    """Call ``listener(model_name, error, seconds)`` after every model load track_model_load sees; ``error`` is None on success."""
+    _load_listeners.append(listener)
+
+
+def _notify_load(model_name, error, seconds):
+    for listener in _load_listeners:
+        listener(model_name, error, seconds)
+
+
+def track_model_load(model_name):
+    """
+    Decorate a lazy ``_get_model``: the first successful call records the load time and
+    the model's memory; failed calls count as failed loads. Either way, listeners
+    (add_model_load_listener) hear about it. Later calls cost one check.
+    """
+    def decorator(get_model):
+        loaded = threading.Event()
+
+        @functools.wraps(get_model)
+        def wrapper(*args, **kwargs):
+            if loaded.is_set():
+                return get_model(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                model = get_model(*args, **kwargs)
+            except Exception as e:
+                MODEL_LOADS.inc(model=model_name, status="failed")
+                _notify_load(model_name, str(e), time.perf_counter() - start)
+                raise
+            if not loaded.is_set():
+                loaded.set()
+                seconds = time.perf_counter() - start
+                MODEL_LOADS.inc(model=model_name, status="ok")
+                MODEL_LOAD_SECONDS.observe(seconds, model=model_name)
+                _notify_load(model_name, None, seconds)
+                memory = model_memory_bytes(model[0] if isinstance(model, tuple) else model)
+                if memory is not None:
+                    MODEL_MEMORY.set(memory, model=model_name)
+            return model
+        return wrapper
+    return decorator
+
+
+def _process_memory_lines():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return []
+    return [
+        "# HELP process_resident_memory_bytes Resident memory of this worker process",
+        "# TYPE process_resident_memory_bytes gauge",
+        f"process_resident_memory_bytes {resident_pages * os.sysconf('SC_PAGE_SIZE')}",
+    ]
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_process_memory_lines())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests, errors and in-flight requests per endpoint and
+    timing them end to end. Endpoints are the app's route paths (annotated images under
+    /output/ collapse into one label, unknown paths into "other"), so label cardinality
+    stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _endpoint_for(self, scope):
+        path = scope.get("path", "")
+        if path.startswith("/output/"):
+            return "/output"
+        if self._paths is None:
+            self._paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        return path if path in self._paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint_for(scope)
+        token = _endpoint.set(endpoint)
+        start = time.perf_counter()
+        start_token = _request_start.set(start)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec(endpoint=endpoint)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(status["code"]))
+            if status["code"] >= 500:
+                ERRORS.inc(endpoint=endpoint, status=str(status["code"]))
+            _request_start.reset(start_token)
+            _endpoint.reset(token)
@@ -0,0 +1,234 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+import logging
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+# Prefer /tmp for writable ephemeral storage in Cloud Run
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join("/tmp", "models"))
+DOWNLOAD_RETRIES = int(os.getenv("MODEL_DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_TIMEOUT = float(os.getenv("MODEL_DOWNLOAD_TIMEOUT", "60"))
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ModelSpec:
+    """Where a model file lives: its file name plus the env vars holding its URI and expected SHA-256."""
+
+    __slots__ = ("filename", "uri_env", "sha256_env")
+
+    def __init__(self, filename, uri_env, sha256_env):
+        self.filename = filename
+        self.uri_env = uri_env
+        self.sha256_env = sha256_env
+
+    @property
+    def uri(self):
+        return os.getenv(self.uri_env)  # http(s)://, gs://bucket/path or file://
+
+    @property
+    def sha256(self):
+        value = os.getenv(self.sha256_env, "").strip().lower()
+        return value or None
+
+
+MODEL_SPECS = {
+    "traffic_light": ModelSpec("best_light.pt", "TRAFFIC_LIGHT_MODEL_URI", "TRAFFIC_LIGHT_MODEL_SHA256"),
+    "traffic_sign": ModelSpec("sign_best.pt", "SIGN_BEST_PT_URI", "SIGN_BEST_PT_SHA256"),
+    "roadway_illumination": ModelSpec("illumination_best.pt", "ILLUMINATION_MODEL_URI", "ILLUMINATION_MODEL_SHA256"),
+    "traffic_sign_damage": ModelSpec("sign_damage_best.pt", "SIGN_DAMAGE_MODEL_URI", "SIGN_DAMAGE_MODEL_SHA256"),
+    "traffic_signal_damage": ModelSpec("signal_damage_best.pt", "SIGNAL_DAMAGE_MODEL_URI", "SIGNAL_DAMAGE_MODEL_SHA256"),
+    "pavement_marking": ModelSpec("fastcnn_epoch_90.pth", "PAVEMENT_MODEL_URI", "PAVEMENT_MODEL_SHA256"),
+}
+
+_locks = {name: threading.Lock() for name in MODEL_SPECS}
+# path -> (size, mtime_ns) of files whose checksum has already been verified
+_verified = {}
+
+
+class ChecksumMismatch(RuntimeError):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _verify(path, expected):
+    """Check ``path`` against ``expected`` SHA-256 once per (size, mtime) of the file."""
+    if not expected:
+        return
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    if _verified.get(path) == signature:
+        return
+    actual = file_sha256(path)
+    if actual != expected:
+        raise ChecksumMismatch(f"{os.path.basename(path)}: expected sha256 {expected}, got {actual}")
+    _verified[path] = signature
+
+
+def _http_download(uri, part_path):
+    """Download into ``part_path``, resuming from its current size with an HTTP Range request."""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    request = urllib.request.Request(uri)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+    try:
+        response = urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:  # Range not satisfiable: the partial file is already complete
+            return
+        raise
+    with response:
+        if offset and response.status != 206:
+            logger.info(f"⚠️ Server ignored Range for {uri}, restarting download")
+            offset = 0
+        expected = _expected_size(response, offset)
+        try:
+            with open(part_path, "ab" if offset else "wb") as f:
+                shutil.copyfileobj(response, f, _CHUNK_SIZE)
+        except http.client.IncompleteRead:
+            pass  # a dropped connection; the size check below reports it
+    received = os.path.getsize(part_path)
+    if expected is not None and received < expected:
+        # Keep the .part: the retry resumes from it with a Range request
+        raise urllib.error.ContentTooShortError(f"{uri}: connection closed after {received} of {expected} bytes", None)
+
+
+def _expected_size(response, offset):
+    """Full file size from Content-Range (206) or Content-Length (+ the resumed offset), None if unknown."""
+    content_range = response.headers.get("Content-Range", "")
+    if response.status == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+def _gcs_download(uri, part_path):
+    parsed = urllib.parse.urlparse(uri)
+    try:
+        from google.cloud import storage
+    except Exception as e:
+        raise RuntimeError(f"google-cloud-storage not installed for gs:// URI: {e}")
+    try:
+        client = storage.Client()
+        bucket = client.bucket(parsed.netloc)
+        blob = bucket.blob(urllib.parse.unquote(parsed.path.lstrip("/")))
+        blob.download_to_filename(part_path)
+    except Exception as e:
+        logger.error(f"❌ Failed to download from GCS: {e}")
+        raise RuntimeError(f"Google Cloud Storage download failed: {e}")
+
+
+def download(uri, dest_path, sha256=None, retries=DOWNLOAD_RETRIES):
+    """
+    Fetch ``uri`` to ``dest_path`` atomically: bytes go to ``<dest>.part`` (resumed across
+    attempts and restarts), are checked against ``sha256`` when given, and only then
+    renamed into place, so a reader never sees a partial or corrupt model file.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    part_path = f"{dest_path}.part"
+    scheme = urllib.parse.urlparse(uri).scheme
+    if scheme not in ("http", "https", "gs", "file"):
+        raise ValueError(f"Unsupported URI scheme for model download: {uri}")
+
+    for attempt in range(1, retries + 1):
+        try:
+            if scheme == "gs":
+                _gcs_download(uri, part_path)
+            else:
+                _http_download(uri, part_path)  # urllib handles file:// too (without resume)
+            if sha256:
+                actual = file_sha256(part_path)
+                if actual != sha256:
+                    os.remove(part_path)  # corrupt, don't resume from it
+                    raise ChecksumMismatch(f"{uri}: expected sha256 {sha256}, got {actual}")
+            os.replace(part_path, dest_path)
+            if sha256:
+                stat = os.stat(dest_path)
+                _verified[dest_path] = (stat.st_size, stat.st_mtime_ns)
+            return dest_path
+        except (OSError, urllib.error.URLError, ChecksumMismatch, RuntimeError) as e:
+            client_error = isinstance(e, urllib.error.HTTPError) and 400 <= e.code < 500
+            if attempt == retries or client_error:
+                raise
+            logger.error(f"❌ Download attempt {attempt}/{retries} of {uri} failed: {e}; retrying")
+            time.sleep(min(2 ** attempt, 10))
+
+
+def ensure_model(name, cache_dir=None):
+    """
+    Return a local path for model ``name``: the copy baked into the image if present,
+    else the cached download, else download it from the spec's URI env var.
+    """
+    spec = MODEL_SPECS[name]
+
+    # If local file is baked in the image at BASE_DIR, prefer it
+    baked_path = os.path.join(BASE_DIR, spec.filename)
+    if os.path.exists(baked_path):
+        _verify(baked_path, spec.sha256)
+        return baked_path
+
+    model_path = os.path.join(cache_dir or MODEL_CACHE_DIR, spec.filename)
+    with _locks[name]:
+        if os.path.exists(model_path):
+            _verify(model_path, spec.sha256)
+            return model_path
+
+        uri = spec.uri
+        if not uri:
+            raise FileNotFoundError(
+                f"{spec.filename} not found and {spec.uri_env} not set. Provide {spec.uri_env} to download the model."
+            )
+        start = time.perf_counter()
+        download(uri, model_path, spec.sha256)
+        logger.info(f"✅ Downloaded {spec.filename} in {time.perf_counter() - start:.1f}s")
+    return model_path
+
+
+def fetch_models(names=None, max_workers=None, cache_dir=None):
+    """
+    Ensure several models concurrently. Returns ``{name: path}`` for successes and
+    ``{name: exception}`` for failures instead of stopping at the first error.
+    """
+    names = list(names or MODEL_SPECS)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(names) or 1, thread_name_prefix="model-fetch") as pool:
+        futures = {name: pool.submit(ensure_model, name, cache_dir) for name in names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+    return results
+
+
+if __name__ == "__main__":
+    # Prefetch every configured model, e.g. in an init container: python -m detectors.model_registry
+    failed = False
+    for name, outcome in fetch_models().items():
+        if isinstance(outcome, Exception):
+            failed = True
+            print(f"❌ {name}: {outcome}")
+        else:
+            print(f"✅ {name}: {outcome}")
+    raise SystemExit(1 if failed else 0)
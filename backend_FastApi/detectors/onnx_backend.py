@@ -0,0 +1,205 @@
+import os
+import ast
+import time
+import shutil
+import tempfile
+import threading
+import logging
+import numpy as np
+
+from detectors.cpu_quota import available_cpus
+from detectors.letterbox import YOLO_IMGSZ, letterbox
+from detectors.model_registry import MODEL_CACHE_DIR
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx")
+# Default for every YOLO detector; override per detector with <PREFIX>_BACKEND (e.g. SIGN_BACKEND=onnx)
+DEFAULT_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(MODEL_CACHE_DIR, "onnx"))
+# 0 = one intra-op thread per CPU in the container's quota
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+
+# Same constants as ultralytics.utils.ops.non_max_suppression
+_MAX_WH = 7680
+_MAX_NMS = 30000
+
+_export_lock = threading.Lock()
+
+
+def inference_backend(env_prefix):
+    backend = os.getenv(f"{env_prefix}_BACKEND", DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported {env_prefix}_BACKEND: {backend}. Choose from {BACKENDS}")
+    return backend
+
+
+def _onnx_path_for(pt_path, imgsz):
+    # Keyed by the weights' size + mtime so replacing the .pt re-exports
+    stat = os.stat(pt_path)
+    stem = os.path.splitext(os.path.basename(pt_path))[0]
+    return os.path.join(ONNX_CACHE_DIR, f"{stem}-{stat.st_size}-{stat.st_mtime_ns}-{imgsz}.onnx")
+
+
+def export_onnx(pt_path, imgsz=YOLO_IMGSZ):
+    """
+    Export ultralytics weights to ONNX once (dynamic batch and spatial dims) and cache the
+    graph under ONNX_CACHE_DIR. Later calls, including after restarts, reuse the file.
+    """
+    onnx_path = _onnx_path_for(pt_path, imgsz)
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    with _export_lock:
+        if os.path.exists(onnx_path):
+            return onnx_path
+        from ultralytics import YOLO
+
+        os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+        # Export from a scratch copy: ultralytics writes next to the weights, which may be read-only
+        with tempfile.TemporaryDirectory(dir=ONNX_CACHE_DIR) as scratch:
+            scratch_pt = os.path.join(scratch, os.path.basename(pt_path))
+            shutil.copyfile(pt_path, scratch_pt)
+            exported = YOLO(scratch_pt).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=False)
+            os.replace(exported, onnx_path)
+        logger.info(f"✅ Exported {os.path.basename(pt_path)} to {onnx_path}")
+    return onnx_path
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy NMS over xyxy boxes; each step suppresses against all remaining boxes at once."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(pred, conf_threshold, iou_threshold, max_det=300):
+    """
+    Turn one raw YOLOv8 output (4 + num_classes, anchors) into xyxy boxes, scores and
+    class ids, mirroring ultralytics' class-aware non_max_suppression.
+    """
+    pred = pred.T  # (anchors, 4 + nc)
+    class_scores = pred[:, 4:]
+    cls = class_scores.argmax(1)
+    scores = class_scores[np.arange(len(cls)), cls]
+    mask = scores > conf_threshold
+    if not mask.any():
+        empty = np.zeros((0,), dtype=np.float32)
+        return np.zeros((0, 4), dtype=np.float32), empty, empty
+
+    xywh, scores, cls = pred[mask, :4], scores[mask], cls[mask]
+    order = scores.argsort()[::-1][:_MAX_NMS]
+    xywh, scores, cls = xywh[order], scores[order], cls[order]
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+    # Offset boxes per class so one NMS pass never suppresses across classes
+    keep = nms(boxes + cls[:, None] * _MAX_WH, scores, iou_threshold)[:max_det]
+    return boxes[keep], scores[keep], cls[keep].astype(np.float32)
+
+
+class OnnxBoxes:
+    """Numpy stand-in for ultralytics' Boxes: ``.xyxy``, ``.conf``, ``.cls`` and per-box iteration."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield OnnxBoxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class OnnxResult:
+    def __init__(self, boxes, orig_shape, speed=None):
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+        self.speed = speed  # per-image ms, like ultralytics' Results.speed
+
+
+class OnnxYolo:
+    """
+    Runs an exported YOLOv8 graph with ONNX Runtime on CPU. Called like an ultralytics
+    YOLO model (``model(images, conf=..., iou=...)``) and returns result objects with
+    the same ``boxes`` attributes, so detectors keep their response format.
+    """
+
+    def __init__(self, onnx_path, imgsz=YOLO_IMGSZ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ORT_INTRA_OP_THREADS or available_cpus()
+        options.inter_op_num_threads = ORT_INTER_OP_THREADS
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.names = {int(k): v for k, v in names.items()}
+
+    def _forward(self, letterboxed):
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1], as ultralytics' preprocess does
+        batch = np.stack([lb.image for lb in letterboxed])[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+        return self.session.run(None, {self.input_name: blob})[0]
+
+    def __call__(self, source, conf=0.25, iou=0.45, max_det=300, verbose=False):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        started = time.perf_counter()
+        letterboxed = [letterbox(image, self.imgsz) for image in images]
+        preprocessed = time.perf_counter()
+
+        # One batched run when every letterboxed frame has the same shape, else per shape
+        groups = {}
+        for i, lb in enumerate(letterboxed):
+            groups.setdefault(lb.image.shape, []).append(i)
+        preds = [None] * len(images)
+        for indices in groups.values():
+            outputs = self._forward([letterboxed[i] for i in indices])
+            for i, output in zip(indices, outputs):
+                preds[i] = output
+        forwarded = time.perf_counter()
+
+        results = []
+        for lb, pred in zip(letterboxed, preds):
+            boxes, scores, cls = postprocess(pred, conf, iou, max_det)
+            if len(boxes):
+                boxes = lb.to_original(boxes)
+            results.append(OnnxResult(OnnxBoxes(boxes, scores, cls), lb.orig_shape[:2]))
+
+        per_image = 1000 / len(images)
+        speed = {
+            "preprocess": (preprocessed - started) * per_image,
+            "inference": (forwarded - preprocessed) * per_image,
+            "postprocess": (time.perf_counter() - forwarded) * per_image,
+        }
+        for result in results:
+            result.speed = speed
+        return results
+
+
+def load_onnx_model(pt_path, imgsz=YOLO_IMGSZ):
+    return OnnxYolo(export_onnx(pt_path, imgsz), imgsz)
@@ -1,12 +1,18 @@
 import os
+import time
+import numpy as np
 import torch
 import torch.nn as nn
 import torchvision.transforms as transforms
 from PIL import Image, ImageDraw, ImageFont
 import threading
 import logging
-import urllib.parse
-import urllib.request
+
+from detectors.image_io import load_image
+from detectors.metrics import observe_stage, track_model_load
+from detectors.model_registry import ensure_model
+from detectors.pavement_optimize import optimize_with_self_check
+from detectors.rendering import RENDER_FILE, render_output
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +35,9 @@ CLASS_NAMES = [
 _model = None
 _model_lock = threading.Lock()
 _transform = None
+_device = None
+_channels_last = False
+_optimization = {"mode": "none"}
 
 # CNN Model Definition (same as training script)
 class FastCNN(nn.Module):
@@ -51,49 +60,14 @@ class FastCNN(nn.Module):
         return self.fc(self.conv(x))
 
 
-def _download_to_path(uri: str, dest_path: str):
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    parsed = urllib.parse.urlparse(uri)
-    if parsed.scheme in ("http", "https"):
-        urllib.request.urlretrieve(uri, dest_path)
-        return dest_path
-    if parsed.scheme == "gs":
-        try:
-            from google.cloud import storage
-            client = storage.Client()
-            bucket = client.bucket(parsed.netloc)
-            blob = bucket.blob(urllib.parse.unquote(parsed.path.lstrip("/")))
-            blob.download_to_filename(dest_path)
-            return dest_path
-        except Exception as e:
-            logger.error(f"❌ Failed to download from GCS: {e}")
-            raise RuntimeError(f"Google Cloud Storage download failed: {e}")
-    raise ValueError(f"Unsupported URI scheme for model download: {uri}")
-
-
 def _ensure_model_file() -> str:
-    # Prefer /tmp for writable ephemeral storage in Cloud Run
-    models_dir = os.path.join("/tmp", "models")
-    os.makedirs(models_dir, exist_ok=True)
-    model_path = os.path.join(models_dir, "fastcnn_epoch_90.pth")
-
-    # If local file is baked in the image at BASE_DIR, prefer it
-    baked_path = os.path.join(BASE_DIR, "fastcnn_epoch_90.pth")
-    if os.path.exists(baked_path):
-        return baked_path
-
-    if not os.path.exists(model_path):
-        uri = os.getenv("PAVEMENT_MODEL_URI")  # http(s):// or gs://bucket/path
-        if not uri:
-            raise FileNotFoundError(
-                "fastcnn_epoch_90.pth not found and PAVEMENT_MODEL_URI not set. Provide PAVEMENT_MODEL_URI to download the model."
-            )
-        _download_to_path(uri, model_path)
-    return model_path
+    # Baked-in file, cached download or fresh checksum-verified download (see detectors/model_registry.py)
+    return ensure_model("pavement_marking")
 
 
+@track_model_load("pavement_marking")
 def _get_model_and_transform():
-    global _model, _transform
+    global _model, _transform, _device, _channels_last, _optimization
     if _model is None:
         with _model_lock:
             if _model is None:
@@ -102,17 +76,22 @@ def _get_model_and_transform():
                     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
                     
                     # Initialize model architecture
-                    _model = FastCNN(num_classes=len(CLASS_NAMES), image_size=128).to(device)
+                    model = FastCNN(num_classes=len(CLASS_NAMES), image_size=128).to(device)
                     
                     # Load trained weights
-                    _model.load_state_dict(torch.load(model_path, map_location=device))
-                    _model.eval()
+                    model.load_state_dict(torch.load(model_path, map_location=device))
+                    model.eval()
                     
                     # Setup image transform
                     _transform = transforms.Compose([
                         transforms.Resize((128, 128)),  # Resize to training size
                         transforms.ToTensor()           # Convert to tensor
                     ])
+
+                    # Optional INT8 / TorchScript / compiled variant, self-checked against the float model
+                    model, _channels_last, _optimization = optimize_with_self_check(model, _transform, device)
+                    _device = device
+                    _model = model
                     
                     logger.info(f"✅ Pavement marking CNN model loaded successfully on {device}")
                 except Exception as e:
@@ -122,6 +101,37 @@ def _get_model_and_transform():
     return _model, _transform
 
 
+def _to_model_input(tensor):
+    tensor = tensor.to(_device)
+    return tensor.contiguous(memory_format=torch.channels_last) if _channels_last else tensor
+
+
+def model_identity():
+    """
+    Model file and the numeric path actually in use (part of result cache keys): the
+    requested PAVEMENT_OPTIMIZE, the variant the self-check kept and its memory layout.
+    """
+    model_path = _ensure_model_file()
+    _get_model_and_transform()  # the self-check decides the variant at load time
+    stat = os.stat(model_path)
+    return {
+        "model": model_path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "optimize": os.getenv("PAVEMENT_OPTIMIZE", "none").lower(),
+        "optimized": _optimization["mode"],
+        "fell_back": "requested" in _optimization,
+        "channels_last": _channels_last,
+    }
+
+
+def warmup():
+    """Load the model and run one dummy forward pass so the first request doesn't pay for either."""
+    model, _ = _get_model_and_transform()
+    with torch.no_grad():
+        model(_to_model_input(torch.zeros(1, 3, 128, 128)))
+
+
 def _draw_classification_on_image(pil_image, predicted_class, confidence):
     """Draw classification result on image (similar to original script)"""
     draw = ImageDraw.Draw(pil_image)
@@ -172,38 +182,55 @@ def detect_pavement_marking(image_path, output_dir="output"):
         if ext not in SUPPORTED_FORMATS:
             raise ValueError(f"Unsupported image format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
 
-        # Load image using PIL
-        try:
-            pil_image = Image.open(image_path).convert("RGB")
-        except Exception as e:
-            raise ValueError(f"Failed to open image: {e}")
+        image = load_image(image_path)
+    except Exception as e:
+        logger.error(f"❌ Pavement marking classification failed: {e}")
+        raise RuntimeError(f"Pavement marking classification failed: {e}")
+
+    return detect_pavement_marking_array(image, os.path.basename(image_path), output_dir)
+
+
+def detect_pavement_marking_array(image, filename, output_dir="output", render=None):
+    """
+    Classify an already-decoded BGR uint8 image (see detectors/image_io.py).
+    ``filename`` only names the annotated output; ``render`` picks how (or whether)
+    it is produced (see detectors/rendering.py).
+    """
+    try:
+        # The CNN transform and PIL drawing work on RGB; image is not modified
+        pil_image = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]))
 
         # Get model and transform
         model, transform = _get_model_and_transform()
-        device = next(model.parameters()).device
 
         # Preprocess image for CNN
-        input_tensor = transform(pil_image).unsqueeze(0).to(device)  # Add batch dimension
+        started = time.perf_counter()
+        input_tensor = _to_model_input(transform(pil_image).unsqueeze(0))  # Add batch dimension
+        preprocessed = time.perf_counter()
 
         # Run classification
         with torch.no_grad():
             output = model(input_tensor)
+            forwarded = time.perf_counter()
             probs = torch.nn.functional.softmax(output, dim=1)
             confidence_tensor, predicted_class_idx = torch.max(probs, 1)
             
             predicted_class = CLASS_NAMES[predicted_class_idx.item()]
             confidence = confidence_tensor.item() * 100  # Convert to percentage
+        observe_stage("preprocess", preprocessed - started)
+        observe_stage("forward", forwarded - preprocessed)
+        observe_stage("postprocess", time.perf_counter() - forwarded)
 
-        # Draw classification result on image
-        result_image = pil_image.copy()  # Don't modify original
-        _draw_classification_on_image(result_image, predicted_class, confidence)
-
-        # Save result image with classification suffix
-        original = os.path.basename(image_path)
+        # Draw classification result on the image (pil_image is already a private RGB copy)
+        # and write it with a _pavement suffix, or defer / inline / skip it per render mode
+        original = os.path.basename(filename)
         stem, ext = os.path.splitext(original)
-        filename = f"{stem}_pavement{ext}"
-        output_path = os.path.join(OUTPUT_DIR, filename)
-        result_image.save(output_path)
+        filename = render_output(
+            pil_image,
+            lambda canvas: _draw_classification_on_image(canvas, predicted_class, confidence),
+            f"{stem}_pavement{ext}",
+            render,
+        )
 
         # Format response similar to detection models but for classification
         classification_result = [{
@@ -212,7 +239,7 @@ def detect_pavement_marking(image_path, output_dir="output"):
             "bbox": None  # No bounding box for classification
         }]
 
-        print(f"✅ Processed: {filename} → {output_path}")
+        print(f"✅ Processed: {original} → {filename if isinstance(filename, str) else render}")
         print(f"✅ Classified as: {predicted_class} ({confidence:.1f}%)")
         
         return classification_result, filename
@@ -222,3 +249,95 @@ def detect_pavement_marking(image_path, output_dir="output"):
         raise RuntimeError(f"Pavement marking classification failed: {e}")
 
 
+
+
+# ========== Batch Classification ==========
+def _preprocess_into(batch, index, image):
+    """
+    Resize a BGR uint8 image into ``batch[index]`` as RGB CHW float32 in [0, 1]. Uses the
+    same PIL bilinear resize as the single-image ``Resize((128, 128)) + ToTensor`` transform.
+    """
+    size = batch.shape[-1]
+    resized = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1])).resize((size, size), Image.BILINEAR)
+    np.divide(np.asarray(resized).transpose(2, 0, 1), 255.0, out=batch[index], dtype=np.float32)
+
+
+def classify_pavement_batch(images, batch_size=None):
+    """
+    Classify many BGR uint8 images. They are resized into one preallocated float32 batch
+    buffer and run through the model ``batch_size`` (PAVEMENT_BATCH_SIZE) at a time.
+    Returns one ``(label, confidence, probabilities)`` tuple per image, where
+    ``probabilities`` maps every CLASS_NAMES entry to its softmax score.
+    """
+    model, _ = _get_model_and_transform()
+    batch_size = max(1, batch_size or int(os.getenv("PAVEMENT_BATCH_SIZE", "32")))
+    buffer = np.empty((min(batch_size, len(images)) or 1, 3, 128, 128), dtype=np.float32)
+
+    results = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        started = time.perf_counter()
+        for i, image in enumerate(chunk):
+            _preprocess_into(buffer, i, image)
+        preprocessed = time.perf_counter()
+        with torch.no_grad():
+            output = model(_to_model_input(torch.from_numpy(buffer[:len(chunk)])))
+            forwarded = time.perf_counter()
+            probs = torch.nn.functional.softmax(output.float(), dim=1).cpu().numpy()
+        for row in probs:
+            idx = int(row.argmax())
+            results.append((CLASS_NAMES[idx], float(row[idx]), dict(zip(CLASS_NAMES, row.tolist()))))
+        # One observation per batch
+        observe_stage("preprocess", preprocessed - started)
+        observe_stage("forward", forwarded - preprocessed)
+        observe_stage("postprocess", time.perf_counter() - forwarded)
+    return results
+
+
+def detect_pavement_marking_batch(images, filenames=None, render=False, batch_size=None, output_dir="output"):
+    """
+    Batched counterpart of ``detect_pavement_marking``. ``images`` are file paths or
+    decoded BGR arrays; ``filenames`` name the annotated outputs (defaults to the paths'
+    basenames). Annotated copies are only written when ``render`` is true.
+    Returns ``[(classification_result, output_filename_or_None), ...]``.
+    """
+    try:
+        if filenames is None:
+            filenames = [os.path.basename(img) if isinstance(img, str) else f"frame_{i}.jpg" for i, img in enumerate(images)]
+        arrays = []
+        for image, filename in zip(images, filenames):
+            if isinstance(image, str):
+                ext = os.path.splitext(image)[1].lower()
+                if ext not in SUPPORTED_FORMATS:
+                    raise ValueError(f"Unsupported image format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
+                image = load_image(image)
+            arrays.append(image)
+
+        outputs = []
+        for image, filename, (label, confidence, probabilities) in zip(
+            arrays, filenames, classify_pavement_batch(arrays, batch_size)
+        ):
+            classification_result = [{
+                "label": label,
+                "confidence": round(confidence, 2),
+                "bbox": None,
+                "probabilities": {k: round(v, 4) for k, v in probabilities.items()},
+            }]
+            output_filename = None
+            if render:
+                pil_image = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]))
+                stem, ext = os.path.splitext(os.path.basename(filename))
+                output_filename = render_output(
+                    pil_image,
+                    lambda canvas: _draw_classification_on_image(canvas, label, confidence * 100),
+                    f"{stem}_pavement{ext}",
+                    RENDER_FILE,
+                )
+            outputs.append((classification_result, output_filename))
+
+        print(f"✅ Classified {len(outputs)} pavement images in batches of {batch_size or os.getenv('PAVEMENT_BATCH_SIZE', '32')}")
+        return outputs
+
+    except Exception as e:
+        logger.error(f"❌ Pavement marking batch classification failed: {e}")
+        raise RuntimeError(f"Pavement marking batch classification failed: {e}")
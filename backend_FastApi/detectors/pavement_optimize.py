@@ -0,0 +1,164 @@
+import os
+import copy
+import time
+import logging
+import torch
+import torch.nn as nn
+from PIL import Image
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Comma-separated: at most one of dynamic|static (INT8 quantization) plus optional script|compile.
+# "none" (default) keeps the float32 eager model.
+PAVEMENT_OPTIMIZE = os.getenv("PAVEMENT_OPTIMIZE", "none").lower()
+PAVEMENT_CHANNELS_LAST = os.getenv("PAVEMENT_CHANNELS_LAST", "0").lower() in ("1", "true", "yes")
+# Directory of representative .jpg/.png images for static calibration and the self-check;
+# without it the float model is kept (fail closed)
+CALIBRATION_DIR = os.getenv("PAVEMENT_CALIBRATION_DIR", "")
+CALIBRATION_MAX_IMAGES = int(os.getenv("PAVEMENT_CALIBRATION_MAX_IMAGES", "64"))
+# Fraction of calibration images whose top-1 class must match the float model
+MIN_AGREEMENT = float(os.getenv("PAVEMENT_OPTIMIZE_MIN_AGREEMENT", "0.95"))
+
+QUANTIZATION_MODES = ("dynamic", "static")
+GRAPH_MODES = ("script", "compile")
+
+
+def parse_modes(value=PAVEMENT_OPTIMIZE):
+    modes = [m.strip() for m in value.split(",") if m.strip() and m.strip() != "none"]
+    unknown = [m for m in modes if m not in QUANTIZATION_MODES + GRAPH_MODES]
+    if unknown:
+        raise ValueError(f"Unsupported PAVEMENT_OPTIMIZE modes: {unknown}. Choose from {QUANTIZATION_MODES + GRAPH_MODES}")
+    if len([m for m in modes if m in QUANTIZATION_MODES]) > 1 or len([m for m in modes if m in GRAPH_MODES]) > 1:
+        raise ValueError(f"PAVEMENT_OPTIMIZE takes at most one of {QUANTIZATION_MODES} and one of {GRAPH_MODES}")
+    return modes
+
+
+def calibration_batch(transform):
+    """Preprocessed images from PAVEMENT_CALIBRATION_DIR shaped (N, 3, H, W), or None when there are none."""
+    tensors = []
+    if CALIBRATION_DIR and os.path.isdir(CALIBRATION_DIR):
+        for name in sorted(os.listdir(CALIBRATION_DIR)):
+            if os.path.splitext(name)[1].lower() not in (".jpg", ".jpeg", ".png"):
+                continue
+            try:
+                with Image.open(os.path.join(CALIBRATION_DIR, name)) as img:
+                    tensors.append(transform(img.convert("RGB")))
+            except Exception as e:
+                logger.error(f"❌ Skipping calibration image {name}: {e}")
+            if len(tensors) >= CALIBRATION_MAX_IMAGES:
+                break
+    return torch.stack(tensors) if tensors else None
+
+
+def _quantize_dynamic(model):
+    # Dynamic quantization only covers Linear layers (convs need static); fc holds ~95% of FastCNN's weights
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _quantize_static(model, calibration):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(model, qconfig_mapping, (calibration[:1],))  # fuses conv+relu / linear+relu
+    with torch.no_grad():
+        for chunk in calibration.split(16):
+            prepared(chunk)
+    return convert_fx(prepared)
+
+
+def build_optimized(model, modes, calibration, channels_last=False):
+    """Return an optimized copy of the float ``model``; the original is left untouched."""
+    optimized = copy.deepcopy(model).cpu().eval()
+    if channels_last:
+        optimized = optimized.to(memory_format=torch.channels_last)
+        calibration = calibration.contiguous(memory_format=torch.channels_last)
+
+    if "dynamic" in modes:
+        optimized = _quantize_dynamic(optimized)
+    elif "static" in modes:
+        optimized = _quantize_static(optimized, calibration)
+
+    if "script" in modes:
+        with torch.no_grad():
+            optimized = torch.jit.freeze(torch.jit.script(optimized))
+    elif "compile" in modes:
+        optimized = torch.compile(optimized)
+    return optimized
+
+
+def top1_agreement(reference, candidate, calibration, channels_last=False):
+    """Fraction of calibration inputs where ``candidate`` predicts the same class as ``reference``."""
+    candidate_input = calibration.contiguous(memory_format=torch.channels_last) if channels_last else calibration
+    with torch.no_grad():
+        expected = reference(calibration).argmax(1)
+        actual = candidate(candidate_input).argmax(1)
+    return (expected == actual).float().mean().item()
+
+
+def _latency_ms(model, sample, runs=10):
+    with torch.no_grad():
+        model(sample)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(sample)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def optimize_with_self_check(model, transform, device):
+    """
+    Build the PAVEMENT_OPTIMIZE variant of the float ``model`` and keep it only if its
+    top-1 predictions agree with the float model on the calibration set (at least
+    PAVEMENT_OPTIMIZE_MIN_AGREEMENT). Returns ``(model, channels_last, status)``; without
+    calibration images or on any failure the float model comes back unchanged.
+    """
+    modes = parse_modes()
+    if not modes and not PAVEMENT_CHANNELS_LAST:
+        return model, False, {"mode": "none"}
+    if device.type != "cpu":
+        logger.info("⚠️ PAVEMENT_OPTIMIZE targets CPU inference, keeping the float model on GPU")
+        return model, False, {"mode": "none", "reason": "gpu"}
+
+    mode = ",".join(modes) or "none"
+    status = {"mode": mode, "channels_last": PAVEMENT_CHANNELS_LAST}
+    try:
+        calibration = calibration_batch(transform)
+        if calibration is None:
+            # Nothing real to check the variant against, so it can't be trusted
+            logger.error(f"❌ No PAVEMENT_CALIBRATION_DIR images to self-check the pavement model ({mode}), using float model")
+            return model, False, {"mode": "none", "requested": mode, "reason": "no calibration images"}
+        optimized = build_optimized(model, modes, calibration, PAVEMENT_CHANNELS_LAST)
+        agreement = top1_agreement(model, optimized, calibration, PAVEMENT_CHANNELS_LAST)
+    except Exception as e:
+        logger.error(f"❌ Pavement model optimization ({mode}) failed, using float model: {e}")
+        return model, False, {"mode": "none", "requested": mode, "reason": str(e)}
+
+    status.update(agreement=round(agreement, 4), calibration_images=len(calibration))
+    if agreement < MIN_AGREEMENT:
+        logger.error(f"❌ Pavement model ({mode}) top-1 agreement {agreement:.3f} < {MIN_AGREEMENT}, using float model")
+        return model, False, {"mode": "none", "requested": mode, "agreement": status["agreement"]}
+
+    sample = calibration[:1]
+    optimized_sample = sample.contiguous(memory_format=torch.channels_last) if PAVEMENT_CHANNELS_LAST else sample
+    status["float_ms"] = round(_latency_ms(model, sample), 3)
+    status["optimized_ms"] = round(_latency_ms(optimized, optimized_sample), 3)
+    status["float_weight_bytes"] = state_dict_bytes(model)
+    status["optimized_weight_bytes"] = state_dict_bytes(optimized) or None  # frozen TorchScript inlines its weights
+    logger.info(
+        f"✅ Pavement model optimized ({mode}, channels_last={PAVEMENT_CHANNELS_LAST}): "
+        f"top-1 agreement {agreement:.3f}, {status['float_ms']}ms → {status['optimized_ms']}ms per image"
+    )
+    return optimized, PAVEMENT_CHANNELS_LAST, status
+
+
+def state_dict_bytes(model):
+    """Approximate weight memory of a (possibly quantized or scripted) model."""
+    total = 0
+    for value in model.state_dict().values():
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, tuple):  # packed quantized params
+            total += sum(v.numel() * v.element_size() for v in value if isinstance(v, torch.Tensor))
+    return total
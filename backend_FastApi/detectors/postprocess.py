@@ -0,0 +1,120 @@
+import os
+import contextvars
+from contextlib import contextmanager
+import numpy as np
+
+# Optional per-detector output limits, e.g. SIGN_CLASSES=stop,yield  SIGN_MIN_AREA=100  SIGN_MAX_DET=50
+#   <PREFIX>_CLASSES  - comma-separated class names (or ids) to keep; empty keeps every class
+#   <PREFIX>_MIN_AREA - drop boxes smaller than this many pixels (in original image coordinates)
+#   <PREFIX>_MAX_DET  - keep at most this many boxes, highest confidence first
+
+# (sx, sy) from the analyzed image to the full-resolution upload, set by decode_scope around
+# the detectors of a reduced decode so MIN_AREA is still measured in original pixels
+_decode_scale = contextvars.ContextVar("postprocess_decode_scale", default=(1.0, 1.0))
+
+
+@contextmanager
+def decode_scope(image_shape, source_size):
+    """Run detectors on a reduced decode of ``image_shape`` whose full resolution is ``source_size`` (width, height)."""
+    token = _decode_scale.set((source_size[0] / image_shape[1], source_size[1] / image_shape[0]))
+    try:
+        yield
+    finally:
+        _decode_scale.reset(token)
+
+
+def postprocess_config(env_prefix):
+    """The <PREFIX>_CLASSES / _MIN_AREA / _MAX_DET limits as ``build_detections`` keyword arguments (also part of cache keys)."""
+    classes = [c.strip() for c in os.getenv(f"{env_prefix}_CLASSES", "").split(",") if c.strip()]
+    max_det = int(os.getenv(f"{env_prefix}_MAX_DET", "0"))
+    return {
+        "classes": classes or None,
+        "min_area": float(os.getenv(f"{env_prefix}_MIN_AREA", "0")),
+        "max_det": max_det or None,
+    }
+
+
+def _to_numpy(values):
+    if hasattr(values, "cpu"):  # torch tensors from ultralytics results
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=np.float32)
+
+
+def result_arrays(result):
+    """
+    ``(xyxy (N, 4), conf (N,), cls (N,))`` float32 arrays for a YOLO result. ultralytics
+    results are copied off the device once, as the packed ``boxes.data`` tensor.
+    """
+    boxes = result.boxes
+    if boxes is None or not len(boxes):
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32), np.zeros((0,), dtype=np.float32)
+    data = getattr(boxes, "data", None)
+    if data is not None:  # columns: x1, y1, x2, y2, [track id,] conf, cls
+        data = _to_numpy(data)
+        return data[:, :4], data[:, -2], data[:, -1]
+    return _to_numpy(boxes.xyxy).reshape(-1, 4), _to_numpy(boxes.conf), _to_numpy(boxes.cls)
+
+
+def _class_ids(names, classes):
+    wanted = {str(c) for c in classes}
+    return [i for i, name in names.items() if name in wanted or str(i) in wanted]
+
+
+def build_detections(result, names, letterboxed=None, classes=None, min_area=0.0, max_det=None, include_bbox=True):
+    """
+    Turn one YOLO result into the detectors' response list and the ``(x1, y1, x2, y2, text)``
+    boxes to draw, with every step done on whole arrays: mapping out of the shared
+    ``letterboxed`` frame, class filtering, ``min_area`` (in full-resolution pixels, see
+    decode_scope), ``max_det`` (highest confidence
+    first, original order kept), integer coordinates and 2-decimal confidences.
+    """
+    xyxy, conf, cls = result_arrays(result)
+    if not len(conf):
+        return [], []
+    if letterboxed is not None:
+        xyxy = letterboxed.to_original(xyxy)
+
+    keep = np.ones(len(conf), dtype=bool)
+    if classes:
+        keep &= np.isin(cls, _class_ids(names, classes))
+    if min_area:
+        sx, sy = _decode_scale.get()
+        keep &= (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1]) * (sx * sy) >= min_area
+    indices = np.flatnonzero(keep)
+    if max_det is not None and len(indices) > max_det:
+        top = np.argsort(-conf[indices], kind="stable")[:max_det]
+        indices = np.sort(indices[top])
+
+    coords = xyxy[indices].astype(np.int64).tolist()  # truncates, like int() on each coordinate
+    confidences = np.round(conf[indices].astype(np.float64), 2).tolist()
+    labels = [names[c] for c in cls[indices].astype(np.int64).tolist()]
+
+    if include_bbox:
+        detections = [
+            {"label": label, "confidence": c, "bbox": box}
+            for label, c, box in zip(labels, confidences, coords)
+        ]
+    else:
+        detections = [{"label": label, "confidence": c} for label, c in zip(labels, confidences)]
+    boxes = [(*box, f"{label} {c}") for label, c, box in zip(labels, confidences, coords)]
+    return detections, boxes
+
+
+def rescale_detections(detections, image_shape, source_size):
+    """
+    Map ``bbox`` coordinates (in place) from a reduced decode of ``image_shape`` back to the
+    ``(width, height)`` of the full-resolution image, see image_io.decode_reduced.
+    """
+    width, height = source_size
+    sx, sy = width / image_shape[1], height / image_shape[0]
+    if (sx, sy) == (1.0, 1.0):
+        return detections
+    for detection in detections:
+        bbox = detection.get("bbox")
+        if bbox is not None:
+            x1, y1, x2, y2 = bbox
+            detection["bbox"] = [
+                min(width, round(x1 * sx)), min(height, round(y1 * sy)),
+                min(width, round(x2 * sx)), min(height, round(y2 * sy)),
+            ]
+    return detections
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import threading
+import importlib
+import logging
+
+from detectors.image_io import REDUCED_DECODE
+from detectors.letterbox import YOLO_IMGSZ
+from detectors.tiling import tiling_mode
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DetectorSpec:
+    """
+    Where a detector lives (module + single-image analyzer), its env var prefix, the model
+    name its loads are tracked under (detectors/metrics.py) and the smallest frame it needs: YOLO models letterbox the long side to YOLO_IMGSZ, FastCNN
+    squashes both sides to 128 px.
+    """
+
+    __slots__ = ("module", "analyzer", "env_prefix", "model", "min_long_side", "min_short_side")
+
+    def __init__(self, module, analyzer, env_prefix, model, min_long_side=0, min_short_side=0):
+        self.module = module
+        self.analyzer = analyzer
+        self.env_prefix = env_prefix
+        self.model = model
+        self.min_long_side = min_long_side
+        self.min_short_side = min_short_side
+
+
+# Detector name -> spec. The modules pull in torch / ultralytics, so they are imported on
+# first use (or by the startup preload below), never by `import model_api`.
+DETECTORS = {
+    "light": DetectorSpec("detectors.trafficLightdetection", "detect_traffic_light_array", "TRAFFIC_LIGHT", "traffic_light", YOLO_IMGSZ),
+    "sign": DetectorSpec("detectors.trafficsign_detection", "detect_traffic_sign_array", "SIGN", "traffic_sign", YOLO_IMGSZ),
+    "illumination": DetectorSpec("detectors.roadway_illumination_detection", "detect_roadway_illumination_array", "ILLUMINATION", "roadway_illumination", YOLO_IMGSZ),
+    "sign_damage": DetectorSpec("detectors.traffic_sign_damage_detection", "detect_traffic_sign_damage_array", "SIGN_DAMAGE", "traffic_sign_damage", YOLO_IMGSZ),
+    "signal_damage": DetectorSpec("detectors.traffic_signal_damage_detection", "detect_traffic_signal_damage_array", "SIGNAL_DAMAGE", "traffic_signal_damage", YOLO_IMGSZ),
+    "pavement": DetectorSpec("detectors.pavement_marking_detection", "detect_pavement_marking_array", "PAVEMENT", "pavement_marking", min_short_side=128),
+}
+
+# Import every detector module on a background thread at startup, so the first request doesn't
+# pay for the ML stack while /healthz answers right away; 0 = import on first request only
+PRELOAD_IMPORTS = os.getenv("PRELOAD_IMPORTS", "1") == "1"
+
+
+def detector_module(name):
+    """The module for detector ``name`` (e.g. "light"), imported on first call."""
+    return importlib.import_module(DETECTORS[name].module)
+
+
+def is_imported(name):
+    return DETECTORS[name].module in sys.modules
+
+
+def decode_target(name):
+    """
+    ``(min_long_side, min_short_side)`` to pass to image_io.decode_reduced for detector
+    ``name``, or None for a full-resolution decode (REDUCED_DECODE=0, or a YOLO detector
+    whose tiling mode isn't "off", since tiles are cut from the full-resolution frame).
+    Part of result cache keys.
+    """
+    spec = DETECTORS[name]
+    if not REDUCED_DECODE or (spec.min_long_side and tiling_mode(spec.env_prefix) != "off"):
+        return None
+    return spec.min_long_side, spec.min_short_side
+
+
+def shared_decode_target(names):
+    """One decode target covering every detector in ``names``, for a frame decoded once and shared."""
+    targets = [decode_target(name) for name in names]
+    if not targets or None in targets:
+        return None
+    return max(t[0] for t in targets), max(t[1] for t in targets)
+
+
+def bind(name, attr):
+    """A function that forwards to ``attr`` of detector ``name``'s module, importing it on first call."""
+    def call(*args, **kwargs):
+        return getattr(detector_module(name), attr)(*args, **kwargs)
+
+    call.__name__ = attr
+    call.__qualname__ = f"{name}.{attr}"
+    return call
+
+
+def _import_all(names):
+    for name in names:
+        start = time.perf_counter()
+        try:
+            detector_module(name)
+        except Exception as e:
+            logger.error(f"❌ Failed to import {name} detector: {e}")
+            continue
+        logger.info(f"✅ Imported {name} detector in {time.perf_counter() - start:.2f}s")
+
+
+def start_import_preload(names=None):
+    """Import the detector modules (default: all) on a daemon thread; requests needing one just wait on the import lock."""
+    names = [n for n in (names or DETECTORS) if not is_imported(n)]
+    if names:
+        threading.Thread(target=_import_all, args=(names,), name="import-preload", daemon=True).start()
+    return names
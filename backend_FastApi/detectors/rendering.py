@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import base64
+import threading
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+from detectors.metrics import observe_stage
+from detectors.storage import register_output
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+
+# Render modes, chosen per request (?render=...) with RENDER_MODE as the default:
+#   file     - draw and write output/<name> before responding (original behaviour)
+#   none     - JSON only, nothing is drawn or written
+#   deferred - respond with the /output URL right away; a background worker draws and writes it
+#   inline   - respond with a downscaled JPEG/WebP as base64 in the JSON, nothing is written
+RENDER_FILE = "file"
+RENDER_NONE = "none"
+RENDER_DEFERRED = "deferred"
+RENDER_INLINE = "inline"
+RENDER_MODES = (RENDER_FILE, RENDER_NONE, RENDER_DEFERRED, RENDER_INLINE)
+DEFAULT_RENDER_MODE = os.getenv("RENDER_MODE", RENDER_FILE).lower()
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "1"))
+# Beyond this many pending deferred renders, render synchronously instead of queueing more frames
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "64"))
+INLINE_FORMAT = os.getenv("INLINE_IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+INLINE_MAX_SIDE = int(os.getenv("INLINE_IMAGE_MAX_SIDE", "1024"))
+INLINE_QUALITY = int(os.getenv("INLINE_IMAGE_QUALITY", "80"))
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+_counters = {"file": 0, "none": 0, "deferred": 0, "deferred_sync": 0, "inline": 0, "failed": 0}
+
+
+def check_render_mode(mode):
+    mode = (mode or DEFAULT_RENDER_MODE).lower()
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unsupported render mode: {mode}. Choose from {list(RENDER_MODES)}")
+    return mode
+
+
+def draw_boxes(canvas, boxes, color):
+    """Draw ``(x1, y1, x2, y2, text)`` boxes onto a BGR array in place, the way every YOLO detector labels them."""
+    for x1, y1, x2, y2, text in boxes:
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(canvas, text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+
+def _to_bgr(canvas):
+    if isinstance(canvas, Image.Image):
+        return np.asarray(canvas.convert("RGB"))[:, :, ::-1]
+    return canvas
+
+
+def write_image(canvas, output_filename):
+    """Write a BGR array (cv2) or PIL image to output/ via a temp file + rename, so readers never see a partial file."""
+    path = os.path.join(OUTPUT_DIR, output_filename)
+    ext = os.path.splitext(output_filename)[1]
+    tmp_path = os.path.join(OUTPUT_DIR, f".{uuid.uuid4().hex}.tmp{ext}")
+    try:
+        if isinstance(canvas, Image.Image):
+            canvas.save(tmp_path)
+        elif not cv2.imwrite(tmp_path, canvas):
+            raise RuntimeError(f"cv2.imwrite failed for {output_filename}")
+        os.replace(tmp_path, path)
+        register_output(path)  # counts towards OUTPUT_MAX_BYTES / OUTPUT_TTL_SECONDS
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def write_bytes(data, output_filename):
+    """Write already-encoded image bytes to output/ with the same temp file + rename as write_image."""
+    path = os.path.join(OUTPUT_DIR, output_filename)
+    ext = os.path.splitext(output_filename)[1]
+    tmp_path = os.path.join(OUTPUT_DIR, f".{uuid.uuid4().hex}.tmp{ext}")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        register_output(path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def encode_inline(canvas):
+    """Downscale to INLINE_IMAGE_MAX_SIDE and encode as base64 JPEG/WebP at INLINE_IMAGE_QUALITY."""
+    image = _to_bgr(canvas)
+    height, width = image.shape[:2]
+    scale = min(1.0, INLINE_MAX_SIDE / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    if INLINE_FORMAT == "webp":
+        ok, buf = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, INLINE_QUALITY])
+        mime_type = "image/webp"
+    else:
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, INLINE_QUALITY])
+        mime_type = "image/jpeg"
+    if not ok:
+        raise RuntimeError("Inline image encoding failed")
+    return {
+        "mime_type": mime_type,
+        "width": int(image.shape[1]),
+        "height": int(image.shape[0]),
+        "data": base64.b64encode(buf.tobytes()).decode("ascii"),
+    }
+
+
+def inline_from_bytes(image_bytes):
+    """Inline payload for an already-encoded annotated image (e.g. a result cache entry)."""
+    return encode_inline(cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS), thread_name_prefix="render")
+    return _executor
+
+
+def _draw_timed(canvas, draw):
+    start = time.perf_counter()
+    draw(canvas)
+    observe_stage("draw", time.perf_counter() - start)
+
+
+def _write_timed(canvas, output_filename):
+    start = time.perf_counter()
+    path = write_image(canvas, output_filename)
+    observe_stage("encode_write", time.perf_counter() - start)
+    return path
+
+
+def _render_deferred(canvas, draw, output_filename):
+    try:
+        _draw_timed(canvas, draw)
+        _write_timed(canvas, output_filename)
+    except Exception as e:
+        logger.error(f"❌ Deferred render of {output_filename} failed: {e}")
+        with _lock:
+            _counters["failed"] += 1
+    finally:
+        with _lock:
+            _pending.discard(output_filename)
+
+
+def render_output(canvas, draw, output_filename, mode=None):
+    """
+    Finish a detector call according to the render ``mode``. ``draw(canvas)`` annotates
+    ``canvas`` (BGR array or PIL image) in place; the caller must not reuse ``canvas``.
+    Returns the output file name (file / deferred), None (none) or an inline image dict.
+    """
+    mode = check_render_mode(mode)
+    if mode == RENDER_NONE:
+        with _lock:
+            _counters["none"] += 1
+        return None
+
+    if mode == RENDER_INLINE:
+        _draw_timed(canvas, draw)
+        with _lock:
+            _counters["inline"] += 1
+        start = time.perf_counter()
+        inline = encode_inline(canvas)
+        observe_stage("encode_write", time.perf_counter() - start)
+        return inline
+
+    if mode == RENDER_DEFERRED:
+        with _lock:
+            queue_full = len(_pending) >= RENDER_QUEUE_SIZE
+            if not queue_full:
+                _pending.add(output_filename)
+                _counters["deferred"] += 1
+            else:
+                _counters["deferred_sync"] += 1
+        if not queue_full:
+            # The copied context keeps the request's metrics labels on the background timings
+            _get_executor().submit(contextvars.copy_context().run, _render_deferred, canvas, draw, output_filename)
+            return output_filename
+
+    _draw_timed(canvas, draw)
+    _write_timed(canvas, output_filename)
+    with _lock:
+        _counters["file"] += 1
+    return output_filename
+
+
+def is_pending(output_filename):
+    with _lock:
+        return output_filename in _pending
+
+
+def render_stats():
+    with _lock:
+        return {**_counters, "pending": len(_pending), "default_mode": DEFAULT_RENDER_MODE}
+
+
+def shutdown_renderer(wait=True):
+    """Let queued deferred renders finish (on shutdown) so their URLs don't dangle."""
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
@@ -0,0 +1,261 @@
+import os
+import copy
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from detectors.rendering import RENDER_FILE, RENDER_NONE, RENDER_INLINE, inline_from_bytes, write_bytes
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+
+# Memory tier: bounded by entry count and by the total size of cached annotated images
+MEMORY_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+MEMORY_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Disk tier: disabled unless RESULT_CACHE_DIR is set; survives restarts
+DISK_DIR = os.getenv("RESULT_CACHE_DIR", "")
+DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(digest, detector, identity):
+    """Detections key = image bytes hash + detector + model file identity / thresholds."""
+    ident = json.dumps(identity, sort_keys=True, default=str)
+    return hashlib.sha256(f"{digest}|{detector}|{ident}".encode()).hexdigest()
+
+
+def image_key(key, output_ext):
+    """Annotated image key = detections key + image format; a separate entry, so JSON-only lookups never depend on it."""
+    return hashlib.sha256(f"{key}|image|{output_ext.lower()}".encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("detections", "suffix", "image_bytes")
+
+    def __init__(self, detections, suffix, image_bytes):
+        self.detections = detections
+        self.suffix = suffix
+        self.image_bytes = image_bytes
+
+    @property
+    def size(self):
+        return len(self.image_bytes)
+
+
+class ResultCache:
+    """
+    Two-tier cache of detector results: detections and already-encoded annotated
+    images, as separate entries. The memory tier is an LRU; the optional disk tier is size-capped and evicts
+    least recently used entries (by file mtime, refreshed on every hit).
+    """
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, max_bytes=MEMORY_MAX_BYTES,
+                 disk_dir=DISK_DIR, disk_max_bytes=DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index = OrderedDict()  # key -> bytes on disk, oldest first
+        self._disk_bytes = 0
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "memory_evictions": 0, "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # ---------- disk tier ----------
+    def _disk_paths(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json"), os.path.join(self.disk_dir, f"{key}.img")
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            meta_path, img_path = self._disk_paths(key)
+            try:
+                size = os.path.getsize(meta_path) + os.path.getsize(img_path)
+                entries.append((os.path.getmtime(meta_path), key, size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+        logger.info(f"✅ Result cache disk tier: {len(self._disk_index)} entries, {self._disk_bytes} bytes in {self.disk_dir}")
+
+    def _disk_get(self, key):
+        meta_path, img_path = self._disk_paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(img_path, "rb") as f:
+                image_bytes = f.read()
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return _Entry(meta["detections"], meta["suffix"], image_bytes)
+
+    def _disk_put(self, key, entry):
+        meta_path, img_path = self._disk_paths(key)
+        try:
+            # Write-then-rename so a crash never leaves a half-written entry behind
+            for path, mode, payload in (
+                (img_path, "wb", entry.image_bytes),
+                (meta_path, "w", json.dumps({"detections": entry.detections, "suffix": entry.suffix})),
+            ):
+                tmp = f"{path}.tmp"
+                with open(tmp, mode) as f:
+                    f.write(payload)
+                os.replace(tmp, path)
+            size = os.path.getsize(meta_path) + os.path.getsize(img_path)
+        except OSError as e:
+            logger.error(f"❌ Result cache disk write failed: {e}")
+            return
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = size
+            self._disk_bytes += size
+            evict = []
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk_index) > 1:
+                old_key, old_size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= old_size
+                self._counters["disk_evictions"] += 1
+                evict.append(old_key)
+        for old_key in evict:
+            for path in self._disk_paths(old_key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ---------- public API ----------
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry
+            on_disk = key in self._disk_index
+
+        if on_disk:
+            entry = self._disk_get(key)
+            if entry is not None:
+                with self._lock:
+                    if key in self._disk_index:
+                        self._disk_index.move_to_end(key)
+                    self._counters["disk_hits"] += 1
+                self._memory_put(key, entry)
+                return entry
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, detections, suffix, image_bytes):
+        entry = _Entry(copy.deepcopy(detections), suffix, image_bytes)
+        self._memory_put(key, entry)
+        if self.disk_dir:
+            self._disk_put(key, entry)
+
+    def _memory_put(self, key, entry):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old.size
+            self._memory[key] = entry
+            self._memory_bytes += entry.size
+            while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+                self._counters["memory_evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def cached_detect(detector, digest, filename, identity, run, render=RENDER_FILE):
+    """
+    Return ``(detections, output)`` for these image bytes, serving a cached result
+    (and re-materialising its annotated image under this upload's name) without
+    touching the model, or calling ``run()`` and caching what it produced.
+
+    Detections and the annotated image are separate entries: detections are keyed on
+    the image and model only, so "none" hits whatever any render mode cached, while the
+    image is keyed by format as well. Deferred and inline results are served from cached
+    "file" images but don't cache one themselves, since their image isn't on disk yet.
+    """
+    cache = get_result_cache()
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    key = cache_key(digest, detector, identity)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if render == RENDER_NONE:
+            return copy.deepcopy(entry.detections), None
+        image = cache.get(image_key(key, ext))
+        if image is not None:
+            if render == RENDER_INLINE:
+                return copy.deepcopy(entry.detections), inline_from_bytes(image.image_bytes)
+            output_filename = f"{stem}{image.suffix}"
+            write_bytes(image.image_bytes, output_filename)
+            return copy.deepcopy(entry.detections), output_filename
+
+    detections, output = run()
+    if entry is None:
+        cache.put(key, detections, "", b"")
+    if render != RENDER_FILE:
+        return detections, output
+    try:
+        with open(os.path.join(OUTPUT_DIR, output), "rb") as f:
+            image_bytes = f.read()
+    except OSError as e:
+        logger.error(f"❌ Not caching {detector} annotated image, unreadable: {e}")
+        return detections, output
+    cache.put(image_key(key, ext), None, output[len(stem):], image_bytes)
+    return detections, output
+
+
+def cache_stats():
+    return get_result_cache().stats()
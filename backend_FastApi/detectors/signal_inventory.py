@@ -0,0 +1,292 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+import logging
+from collections import Counter
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The traffic-signal inventory the map plots, clustered server-side: a hierarchical grid of Web
+# Mercator cells (CELLS_PER_TILE x CELLS_PER_TILE per 256 px map tile at each zoom), aggregated
+# bottom-up so zoom z's cells are exactly the union of zoom z+1's. Above CLUSTER_MAX_ZOOM the raw
+# points are served. The file is re-checked every SIGNAL_INVENTORY_CHECK_SECONDS and changes are
+# applied as a diff (only added / removed points touch the grid). The default path is the frontend's
+# copy in a checkout; the Docker images bake it in and set SIGNAL_INVENTORY_PATH (see the Dockerfile).
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIGNAL_INVENTORY_PATH = os.getenv(
+    "SIGNAL_INVENTORY_PATH",
+    os.path.join(os.path.dirname(BASE_DIR), "frontend", "src", "data", "traffic-signals.json"),
+)
+SIGNAL_INVENTORY_CHECK_SECONDS = float(os.getenv("SIGNAL_INVENTORY_CHECK_SECONDS", "5"))
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "14"))
+CELLS_PER_TILE = int(os.getenv("CLUSTER_CELLS_PER_TILE", "4"))  # 4 -> 64 px cluster cells
+MAX_ZOOM = 22
+_MAX_LAT = 85.05112878  # Web Mercator's limit
+# Fields kept per point in responses (the inventory's own keys)
+POINT_FIELDS = ("lat", "lng", "location", "condition", "age")
+
+
+def _mercator(lat, lng):
+    """(x, y) in [0, 1) Web Mercator, the XYZ tile scheme's coordinates."""
+    lat = max(-_MAX_LAT, min(_MAX_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    sin = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def _cells(zoom):
+    return (1 << zoom) * CELLS_PER_TILE
+
+
+def _point_key(entry):
+    """Hashable identity of one inventory entry, or None if it has no usable coordinates."""
+    try:
+        lat, lng = float(entry["lat"]), float(entry["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return (lat, lng) + tuple(entry.get(field) for field in POINT_FIELDS[2:])
+
+
+def viewport_cells(zoom, bbox):
+    """Inclusive cell range of ``zoom`` covering ``bbox`` = (min_lng, min_lat, max_lng, max_lat)."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = _mercator(max_lat, min_lng)  # y grows southwards
+    x1, y1 = _mercator(min_lat, max_lng)
+    n = _cells(zoom)
+    return int(x0 * n), int(y0 * n), int(x1 * n), int(y1 * n)
+
+
+def tile_cells(x, y):
+    """Inclusive cell range of XYZ tile (x, y) at its own zoom: tiles never share a cell."""
+    return x * CELLS_PER_TILE, y * CELLS_PER_TILE, (x + 1) * CELLS_PER_TILE - 1, (y + 1) * CELLS_PER_TILE - 1
+
+
+class ClusterIndex:
+    """
+    Per-zoom cluster cells for a set of points. Each cell holds
+    ``[count, sum_lat, sum_lng, Counter(condition)]``; the finest level also keeps its points.
+    ``add`` / ``remove`` update every level in O(zoom levels), so a changed file is applied as a diff.
+    """
+
+    def __init__(self, max_zoom=CLUSTER_MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self.levels = [{} for _ in range(max_zoom + 1)]
+        self.points = {}  # finest cell -> list of point keys
+        self.count = 0
+
+    def _cell(self, key):
+        x, y = _mercator(key[0], key[1])
+        n = _cells(self.max_zoom)
+        return int(x * n), int(y * n)
+
+    def _apply(self, key, sign):
+        cx, cy = self._cell(key)
+        condition = key[3]
+        for zoom in range(self.max_zoom, -1, -1):
+            shift = self.max_zoom - zoom
+            cell = (cx >> shift, cy >> shift)
+            level = self.levels[zoom]
+            aggregate = level.get(cell)
+            if aggregate is None:
+                aggregate = level[cell] = [0, 0.0, 0.0, Counter()]
+            aggregate[0] += sign
+            aggregate[1] += sign * key[0]
+            aggregate[2] += sign * key[1]
+            aggregate[3][condition] += sign
+            if aggregate[3][condition] <= 0:
+                del aggregate[3][condition]
+            if aggregate[0] <= 0:
+                del level[cell]
+        bucket = self.points.setdefault((cx, cy), [])
+        if sign > 0:
+            bucket.append(key)
+        else:
+            bucket.remove(key)
+            if not bucket:
+                del self.points[(cx, cy)]
+        self.count += sign
+
+    def build(self, keys):
+        """Replace the contents with ``keys`` bottom-up: each level is aggregated from the one below."""
+        self.points = {}
+        for key in keys:
+            self.points.setdefault(self._cell(key), []).append(key)
+        finest = {}
+        for cell, bucket in self.points.items():
+            finest[cell] = [
+                len(bucket), sum(k[0] for k in bucket), sum(k[1] for k in bucket), Counter(k[3] for k in bucket)
+            ]
+        self.levels[self.max_zoom] = finest
+        for zoom in range(self.max_zoom - 1, -1, -1):
+            level = {}
+            for (cx, cy), (count, sum_lat, sum_lng, conditions) in self.levels[zoom + 1].items():
+                aggregate = level.get((cx >> 1, cy >> 1))
+                if aggregate is None:
+                    level[(cx >> 1, cy >> 1)] = [count, sum_lat, sum_lng, Counter(conditions)]
+                else:
+                    aggregate[0] += count
+                    aggregate[1] += sum_lat
+                    aggregate[2] += sum_lng
+                    aggregate[3].update(conditions)
+            self.levels[zoom] = level
+        self.count = sum(len(bucket) for bucket in self.points.values())
+
+    def add(self, key):
+        self._apply(key, 1)
+
+    def remove(self, key):
+        self._apply(key, -1)
+
+    def _select(self, cells, cell_range):
+        """``(cell, value)`` of ``cells`` inside the inclusive range, by lookup or by scan, whichever is less work."""
+        cx0, cy0, cx1, cy1 = cell_range
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(cells):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    value = cells.get((cx, cy))
+                    if value is not None:
+                        yield (cx, cy), value
+        else:
+            for (cx, cy), value in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield (cx, cy), value
+
+    def _single(self, zoom, cell):
+        """The one point under a count-1 cell: follow the only occupied child down to the finest level."""
+        for child_zoom in range(zoom + 1, self.max_zoom + 1):
+            level = self.levels[child_zoom]
+            cell = next(
+                child for child in ((cell[0] * 2 + dx, cell[1] * 2 + dy) for dx in (0, 1) for dy in (0, 1))
+                if child in level
+            )
+        return self.points[cell][0]
+
+    def query(self, zoom, cell_range):
+        """
+        ``(clusters, points)`` for the cells of ``zoom`` in ``cell_range`` (inclusive, in that
+        zoom's cell units). Single-point cells come back as points; above max_zoom, all do.
+        """
+        clusters, points = [], []
+        if zoom > self.max_zoom:
+            shift = zoom - self.max_zoom
+            finest = tuple(c >> shift for c in cell_range)
+            for _, bucket in self._select(self.points, finest):
+                points.extend(bucket)
+            return clusters, points
+        for cell, (count, sum_lat, sum_lng, conditions) in self._select(self.levels[zoom], cell_range):
+            if count == 1:
+                points.append(self._single(zoom, cell))
+            else:
+                clusters.append({
+                    "lat": round(sum_lat / count, 6),
+                    "lng": round(sum_lng / count, 6),
+                    "count": count,
+                    "conditions": dict(conditions),
+                })
+        return clusters, points
+
+
+def _point_dict(key):
+    return dict(zip(POINT_FIELDS, key))
+
+
+class SignalInventory:
+    """
+    The inventory file's ClusterIndex, kept in step with the file: at most every
+    SIGNAL_INVENTORY_CHECK_SECONDS a request stats it, and a changed file is diffed against
+    the loaded points. ``version`` (a hash of the file) is the responses' ETag.
+    """
+
+    def __init__(self, path=SIGNAL_INVENTORY_PATH):
+        self.path = path
+        self.index = ClusterIndex()
+        self.version = None
+        self._keys = Counter()
+        self._stat = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "load_errors": 0, "points_added": 0, "points_removed": 0}
+
+    def _reload(self):
+        stat = os.stat(self.path)
+        if self._stat == (stat.st_mtime_ns, stat.st_size):
+            return
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        version = hashlib.sha256(raw).hexdigest()[:16]
+        self._stat = (stat.st_mtime_ns, stat.st_size)
+        if version == self.version:  # touched, not changed
+            return
+        keys = Counter(key for key in map(_point_key, json.loads(raw)) if key is not None)
+        start = time.perf_counter()
+        removed, added = self._keys - keys, keys - self._keys
+        if sum(removed.values()) + sum(added.values()) > len(keys) // 4:
+            # First load or a mostly new file: a bulk build is cheaper than that many updates
+            self.index.build(list(keys.elements()))
+        else:
+            for key in removed.elements():
+                self.index.remove(key)
+            for key in added.elements():
+                self.index.add(key)
+        self._keys = keys
+        self.version = version
+        self._counters["loads"] += 1
+        self._counters["points_added"] += sum(added.values())
+        self._counters["points_removed"] += sum(removed.values())
+        logger.info(
+            f"✅ Signal inventory {version}: {self.index.count} points "
+            f"(+{sum(added.values())} / -{sum(removed.values())}) in {time.perf_counter() - start:.2f}s"
+        )
+
+    def _refresh(self):
+        """Call with the lock held. A file that fails to load (mid-write, bad JSON) keeps the previous index."""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked < SIGNAL_INVENTORY_CHECK_SECONDS:
+            return
+        self._checked = now
+        try:
+            self._reload()
+        except (OSError, ValueError) as e:
+            self._counters["load_errors"] += 1
+            logger.error(f"❌ Failed to load signal inventory {self.path}: {e}")
+            if self.version is None:
+                raise FileNotFoundError(f"Signal inventory unavailable: {e}")
+
+    def query(self, zoom, cell_range):
+        """``(version, clusters, points)`` for ``cell_range`` at ``zoom``; FileNotFoundError if never loaded."""
+        with self._lock:
+            self._refresh()
+            clusters, points = self.index.query(zoom, cell_range)
+            return self.version, clusters, [_point_dict(key) for key in points]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "path": self.path,
+                "version": self.version,
+                "points": self.index.count,
+                "cluster_max_zoom": self.index.max_zoom,
+                "cells": sum(len(level) for level in self.index.levels),
+            }
+
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory():
+    global _inventory
+    if _inventory is None:
+        with _inventory_lock:
+            if _inventory is None:
+                _inventory = SignalInventory()
+    return _inventory
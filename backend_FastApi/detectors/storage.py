@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+TEMP_DIR = os.path.join(BASE_DIR, "temp")
+
+# "content": output names carry the upload's content hash (identical uploads share a file);
+# "uuid": every request gets its own name
+OUTPUT_NAMING = os.getenv("OUTPUT_NAMING", "content").lower()
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", str(1024 * 1024 * 1024)))
+OUTPUT_TTL_SECONDS = float(os.getenv("OUTPUT_TTL_SECONDS", "3600"))
+TEMP_MAX_BYTES = int(os.getenv("TEMP_MAX_BYTES", str(1024 * 1024 * 1024)))
+TEMP_TTL_SECONDS = float(os.getenv("TEMP_TTL_SECONDS", "600"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("STORAGE_SWEEP_INTERVAL", "60"))
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def scoped_filename(filename, digest=None):
+    """
+    ``IMG_0001.jpg`` -> ``IMG_0001_<token>.jpg``, where the token is the upload's content
+    hash (OUTPUT_NAMING=content, needs ``digest``) or a random UUID, so concurrent users
+    uploading the same file name never overwrite each other's outputs.
+    """
+    stem, ext = os.path.splitext(os.path.basename(filename or "upload"))
+    stem = _UNSAFE_CHARS.sub("_", stem)[:64].strip("._") or "upload"
+    token = digest[:16] if digest and OUTPUT_NAMING == "content" else uuid.uuid4().hex[:16]
+    return f"{stem}_{token}{ext.lower()}"
+
+
+class ManagedDir:
+    """
+    A directory bounded by total size and per-file TTL. Files are tracked oldest-first
+    by write time; ``register`` after each write evicts least recently written files
+    once ``max_bytes`` is exceeded, and ``sweep`` (run periodically in the background)
+    also drops files older than ``ttl_seconds``.
+    """
+
+    def __init__(self, name, directory, max_bytes, ttl_seconds):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # file name -> (size, written_at), oldest first
+        self._bytes = 0
+        self._in_use = set()  # never evicted (temp files of requests still running)
+        self._counters = {"writes": 0, "ttl_evictions": 0, "size_evictions": 0, "deletes": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            self._files.clear()
+            self._bytes = 0
+            for mtime, name, size in sorted(entries):
+                self._files[name] = (size, mtime)
+                self._bytes += size
+
+    def _remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def register(self, path):
+        """Account for a file just written under this directory and enforce the size cap."""
+        name = os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            old = self._files.pop(name, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._files[name] = (size, time.time())
+            self._bytes += size
+            self._counters["writes"] += 1
+            evict = self._evict_over_size_locked(keep=name)
+        self._remove(evict)
+
+    def _evict_over_size_locked(self, keep=None):
+        evict = []
+        for name in list(self._files):
+            if self._bytes <= self.max_bytes:
+                break
+            if name == keep or name in self._in_use:
+                continue
+            size, _ = self._files.pop(name)
+            self._bytes -= size
+            self._counters["size_evictions"] += 1
+            evict.append(name)
+        return evict
+
+    def acquire(self, path):
+        with self._lock:
+            self._in_use.add(os.path.basename(path))
+
+    def delete(self, path):
+        name = os.path.basename(path)
+        with self._lock:
+            self._in_use.discard(name)
+            old = self._files.pop(name, None)
+            if old is not None:
+                self._bytes -= old[0]
+                self._counters["deletes"] += 1
+        self._remove([name])
+
+    def sweep(self):
+        """Drop expired files, re-sync with files written by other code paths, then enforce the size cap."""
+        self._scan()
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                name for name, (_, written_at) in self._files.items()
+                if written_at < cutoff and name not in self._in_use
+            ]
+            for name in expired:
+                self._bytes -= self._files.pop(name)[0]
+            self._counters["ttl_evictions"] += len(expired)
+            evict = expired + self._evict_over_size_locked()
+        self._remove(evict)
+        return len(evict)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                **self._counters,
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+        usage = shutil.disk_usage(self.directory)
+        stats.update(disk_total_bytes=usage.total, disk_free_bytes=usage.free)
+        return stats
+
+
+_dirs = None
+_dirs_lock = threading.Lock()
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+        for managed in _dirs.values():
+            try:
+                removed = managed.sweep()
+                if removed:
+                    logger.info(f"🧹 Evicted {removed} files from {managed.name}")
+            except Exception as e:
+                logger.error(f"❌ Storage sweep of {managed.name} failed: {e}")
+
+
+def _get_dirs():
+    global _dirs
+    if _dirs is None:
+        with _dirs_lock:
+            if _dirs is None:
+                dirs = {
+                    "output": ManagedDir("output", OUTPUT_DIR, OUTPUT_MAX_BYTES, OUTPUT_TTL_SECONDS),
+                    "temp": ManagedDir("temp", TEMP_DIR, TEMP_MAX_BYTES, TEMP_TTL_SECONDS),
+                }
+                dirs["temp"].sweep()  # leftovers from a previous run
+                _dirs = dirs
+                threading.Thread(target=_sweep_forever, name="storage-sweeper", daemon=True).start()
+    return _dirs
+
+
+def start_storage():
+    """Scan output/ and temp/, clear temp leftovers and start the background sweeper."""
+    _get_dirs()
+
+
+def register_output(path):
+    """Call after writing an annotated image under output/."""
+    _get_dirs()["output"].register(path)
+
+
+@contextmanager
+def temp_file(filename="upload", suffix=None):
+    """
+    Yield a unique path under temp/ (keeping ``filename``'s extension for decoders that
+    sniff it) and delete the file when the block exits, even on errors.
+    """
+    managed = _get_dirs()["temp"]
+    ext = suffix if suffix is not None else os.path.splitext(filename)[1].lower()
+    path = os.path.join(TEMP_DIR, f"{uuid.uuid4().hex}{ext}")
+    managed.acquire(path)
+    try:
+        yield path
+    finally:
+        managed.delete(path)
+
+
+def storage_stats():
+    return {name: managed.stats() for name, managed in _get_dirs().items()}
@@ -0,0 +1,177 @@
+import os
+import math
+import numpy as np
+
+from detectors.letterbox import YOLO_IMGSZ
+from detectors.onnx_backend import OnnxBoxes, OnnxResult
+from detectors.postprocess import result_arrays
+
+# Sliced inference for high-resolution frames. Modes, per detector with <PREFIX>_TILED and
+# TILED_INFERENCE as the default:
+#   off  - one pass on the whole frame, resized to the model input size (original behaviour)
+#   on   - always tile
+#   auto - tile frames whose long side exceeds TILE_SIZE
+TILING_MODES = ("off", "on", "auto")
+DEFAULT_TILING_MODE = os.getenv("TILED_INFERENCE", "off").lower()
+# The model's input size, so tiles reach it without being downscaled (larger tiles are resized to YOLO_IMGSZ)
+TILE_SIZE = int(os.getenv("TILE_SIZE", str(YOLO_IMGSZ)))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))  # fraction of TILE_SIZE shared by neighbouring tiles
+# Past this many tiles the tile size grows instead (and tiles are downscaled again), so a huge
+# frame can't fan out unboundedly
+TILE_MAX = int(os.getenv("TILE_MAX", "48"))  # 48 keeps a 12 MP (4032x3024) frame at native resolution
+# Tiles in flight per frame; 0 = the model's batch size. Bounds peak memory to one batch of model inputs.
+TILE_BATCH_SIZE = int(os.getenv("TILE_BATCH_SIZE", "0"))
+# Also run the whole (downscaled) frame, for objects larger than the tile overlap
+TILE_FULL_FRAME = os.getenv("TILE_FULL_FRAME", "1") == "1"
+# A box cut by an interior tile edge is dropped when this much of it lies inside a kept box
+TILE_MERGE_IOS = float(os.getenv("TILE_MERGE_IOS", "0.6"))
+TILE_MAX_DET = 300
+
+_EDGE_MARGIN = 2  # px; boxes this close to an interior tile edge count as truncated
+
+
+def tiling_mode(env_prefix, tiled=None):
+    if tiled is True:
+        return "on"
+    if tiled is False:
+        return "off"
+    mode = (tiled or os.getenv(f"{env_prefix}_TILED", DEFAULT_TILING_MODE)).lower()
+    if mode not in TILING_MODES:
+        raise ValueError(f"Unsupported {env_prefix}_TILED: {mode}. Choose from {TILING_MODES}")
+    return mode
+
+
+def tiling_identity(env_prefix):
+    """Tiling settings that change a detector's output (part of result cache keys)."""
+    mode = tiling_mode(env_prefix)
+    if mode == "off":
+        return {"mode": mode}
+    return {
+        "mode": mode,
+        "size": TILE_SIZE,
+        "overlap": TILE_OVERLAP,
+        "max": TILE_MAX,
+        "full_frame": TILE_FULL_FRAME,
+        "merge_ios": TILE_MERGE_IOS,
+    }
+
+
+def use_tiling(image, env_prefix, tiled=None):
+    mode = tiling_mode(env_prefix, tiled)
+    if mode == "auto":
+        return max(image.shape[:2]) > TILE_SIZE
+    return mode == "on"
+
+
+def _starts(length, tile, step):
+    """Evenly spaced tile offsets along one axis; the first starts at 0 and the last ends at ``length``."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / step) + 1
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def tile_grid(height, width, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=TILE_MAX):
+    """
+    ``(x0, y0, x1, y1)`` windows covering a ``height`` x ``width`` frame with at least
+    ``overlap`` (a fraction of the tile size) shared between neighbours. The tile size
+    grows until the grid has at most ``max_tiles`` windows.
+    """
+    overlap = min(max(overlap, 0.0), 0.9)
+    while True:
+        step = max(1, int(tile_size * (1 - overlap)))
+        xs = _starts(width, tile_size, step)
+        ys = _starts(height, tile_size, step)
+        if len(xs) * len(ys) <= max(1, max_tiles):
+            break
+        tile_size = int(tile_size * 1.25) + 1
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in ys for x0 in xs
+    ]
+
+
+def _truncated(boxes, window, width, height):
+    """Boxes touching a window edge that is not also an edge of the full frame."""
+    x0, y0, x1, y1 = window
+    cut = np.zeros(len(boxes), dtype=bool)
+    if x0 > 0:
+        cut |= boxes[:, 0] <= x0 + _EDGE_MARGIN
+    if y0 > 0:
+        cut |= boxes[:, 1] <= y0 + _EDGE_MARGIN
+    if x1 < width:
+        cut |= boxes[:, 2] >= x1 - _EDGE_MARGIN
+    if y1 < height:
+        cut |= boxes[:, 3] >= y1 - _EDGE_MARGIN
+    return cut
+
+
+def merge_boxes(boxes, scores, cls, truncated, sources, iou_threshold, ios_threshold=TILE_MERGE_IOS):
+    """
+    Cross-tile, class-aware greedy NMS. A box is suppressed by a higher-scoring box of the
+    same class from another tile (``sources`` holds each box's tile index) when their IoU
+    exceeds ``iou_threshold``, or, for boxes cut by a tile edge, when more than
+    ``ios_threshold`` of the box lies inside the kept one. Boxes from the same tile were
+    already NMS'd by the model and are left alone (clipping them to the tile can push
+    their IoU back over the threshold).
+    """
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        ios = inter / (areas[rest] + 1e-9)
+        same = (cls[rest] == cls[i]) & (sources[rest] != sources[i])
+        suppressed = same & ((iou > iou_threshold) | (truncated[rest] & (ios > ios_threshold)))
+        order = rest[~suppressed]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def predict_tiled(batcher, image, conf, iou, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=TILE_MAX):
+    """
+    Run ``batcher``'s model over overlapping tiles of a BGR ``image`` and merge the boxes
+    back into full-frame coordinates. Tiles are numpy views of ``image`` (no pixel copies);
+    at most TILE_BATCH_SIZE of them are queued at once, so memory stays at one batch of
+    model inputs however large the frame is. Returns a result with the same ``boxes``
+    attributes as an ultralytics result.
+    """
+    height, width = image.shape[:2]
+    windows = tile_grid(height, width, tile_size, overlap, max_tiles)
+    if len(windows) == 1:  # the frame fits in one tile: a plain full-resolution pass
+        return batcher.predict(image, conf, iou)
+    chunk = max(1, TILE_BATCH_SIZE or batcher.max_batch_size)
+
+    all_boxes, all_scores, all_cls, all_cut = [], [], [], []
+    for start in range(0, len(windows), chunk):
+        group = windows[start:start + chunk]
+        futures = batcher.submit_many([image[y0:y1, x0:x1] for x0, y0, x1, y1 in group], conf, iou)
+        for window, future in zip(group, futures):
+            boxes, scores, cls = result_arrays(future.result())
+            boxes = boxes + np.array(window[:2] * 2, dtype=np.float32)  # tile -> frame coordinates (a copy)
+            all_boxes.append(boxes)
+            all_scores.append(scores)
+            all_cls.append(cls)
+            all_cut.append(_truncated(boxes, window, width, height))
+
+    if TILE_FULL_FRAME:
+        boxes, scores, cls = result_arrays(batcher.predict(image, conf, iou))
+        all_boxes.append(boxes)
+        all_scores.append(scores)
+        all_cls.append(cls)
+        all_cut.append(np.zeros(len(boxes), dtype=bool))
+
+    boxes = np.concatenate(all_boxes)
+    scores = np.concatenate(all_scores)
+    cls = np.concatenate(all_cls)
+    if len(boxes):
+        sources = np.concatenate([np.full(len(b), i) for i, b in enumerate(all_boxes)])
+        keep = merge_boxes(boxes, scores, cls, np.concatenate(all_cut), sources, iou)[:TILE_MAX_DET]
+        boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+    return OnnxResult(OnnxBoxes(boxes, scores, cls), (height, width))
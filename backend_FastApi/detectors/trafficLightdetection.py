@@ -1,11 +1,19 @@
-import cv2
 import numpy as np
 import os
-import urllib.parse
-import urllib.request
+import time
 import threading
 import logging
 
+from detectors.batching import get_batcher
+from detectors.image_io import load_image
+from detectors.letterbox import YOLO_IMGSZ
+from detectors.metrics import record_inference, track_model_load
+from detectors.model_registry import ensure_model
+from detectors.onnx_backend import inference_backend, load_onnx_model
+from detectors.postprocess import build_detections, postprocess_config
+from detectors.rendering import draw_boxes, render_output
+from detectors.tiling import predict_tiled, tiling_identity, use_tiling
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -49,52 +57,27 @@ def _safe_import_ml_libs():
     return True
 
 
-def _download_to_path(uri: str, dest_path: str):
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    parsed = urllib.parse.urlparse(uri)
-    if parsed.scheme in ("http", "https"):
-        urllib.request.urlretrieve(uri, dest_path)
-        return dest_path
-    if parsed.scheme == "gs":
-        try:
-            from google.cloud import storage
-            client = storage.Client()
-            bucket = client.bucket(parsed.netloc)
-            blob = bucket.blob(urllib.parse.unquote(parsed.path.lstrip("/")))
-            blob.download_to_filename(dest_path)
-            return dest_path
-        except Exception as e:
-            logger.error(f"❌ Failed to download from GCS: {e}")
-            raise RuntimeError(f"Google Cloud Storage download failed: {e}")
-    raise ValueError(f"Unsupported URI scheme for model download: {uri}")
-
-
 def _ensure_model_file() -> str:
-    # Prefer /tmp for writable ephemeral storage in Cloud Run
-    models_dir = os.path.join("/tmp", "models")
-    os.makedirs(models_dir, exist_ok=True)
-    model_path = os.path.join(models_dir, "best_light.pt")
-
-    # If local file is baked in the image at BASE_DIR, prefer it
-    baked_path = os.path.join(BASE_DIR, "best_light.pt")
-    if os.path.exists(baked_path):
-        return baked_path
-
-    if not os.path.exists(model_path):
-        uri = os.getenv("TRAFFIC_LIGHT_MODEL_URI")  # http(s):// or gs://bucket/path
-        if not uri:
-            raise FileNotFoundError(
-                "best_light.pt not found and TRAFFIC_LIGHT_MODEL_URI not set. Provide TRAFFIC_LIGHT_MODEL_URI to download the model."
-            )
-        _download_to_path(uri, model_path)
-    return model_path
+    # Baked-in file, cached download or fresh checksum-verified download (see detectors/model_registry.py)
+    return ensure_model("traffic_light")
 
 
+@track_model_load("traffic_light")
 def _get_model():
     global _model
     if _model is None:
         with _model_lock:
             if _model is None:
+                if inference_backend("TRAFFIC_LIGHT") == "onnx":
+                    try:
+                        # Exported once and cached; runs on ONNX Runtime (see detectors/onnx_backend.py)
+                        _model = load_onnx_model(_ensure_model_file())
+                        logger.info("✅ Traffic light model loaded with ONNX Runtime")
+                    except Exception as e:
+                        logger.error(f"❌ Failed to load ONNX model: {e}")
+                        raise RuntimeError(f"Model loading failed: {e}")
+                    return _model
+
                 # Ensure ML libraries are imported
                 if not _safe_import_ml_libs():
                     raise RuntimeError("Required ML libraries could not be imported")
@@ -113,6 +96,37 @@ def _get_model():
     return _model
 
 
+def _predict_batch(images, conf, iou):
+    return _get_model()(images, conf=conf, iou=iou)  # Accepts a list of numpy arrays
+
+
+def model_identity():
+    """Model file and thresholds that determine this detector's output (part of result cache keys)."""
+    model_path = _ensure_model_file()
+    stat = os.stat(model_path)
+    return {
+        "model": model_path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "conf": float(os.getenv("TRAFFIC_LIGHT_CONF", "0.25")),
+        "iou": float(os.getenv("TRAFFIC_LIGHT_IOU", "0.45")),
+        "backend": inference_backend("TRAFFIC_LIGHT"),
+        "tiling": tiling_identity("TRAFFIC_LIGHT"),
+        "postprocess": postprocess_config("TRAFFIC_LIGHT"),
+    }
+
+
+def warmup():
+    """Load the model and run one dummy forward pass so the first request doesn't pay for either."""
+    _get_model()
+    # Through the batcher, so the pass never overlaps a request's on the same model
+    get_batcher("traffic_light", _predict_batch, "TRAFFIC_LIGHT").warmup(
+        np.zeros((YOLO_IMGSZ, YOLO_IMGSZ, 3), dtype=np.uint8),
+        float(os.getenv("TRAFFIC_LIGHT_CONF", "0.25")),
+        float(os.getenv("TRAFFIC_LIGHT_IOU", "0.45")),
+    )
+
+
 # ========== Detection Function ==========
 def detect_traffic_light(image_path, output_dir="output"):
     try:
@@ -120,51 +134,52 @@ def detect_traffic_light(image_path, output_dir="output"):
         if ext not in SUPPORTED_FORMATS:
             raise ValueError(f"Unsupported image format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
 
-        # Load image using PIL for consistent results across formats
-        try:
-            from PIL import Image
-            pil_image = Image.open(image_path).convert("RGB")
-        except Exception as e:
-            raise ValueError(f"Failed to open image: {e}")
+        # Decode straight to BGR (same pixels as the former PIL open + RGB2BGR conversion)
+        image = load_image(image_path)
+    except Exception as e:
+        logger.error(f"❌ Traffic light detection failed: {e}")
+        raise RuntimeError(f"Traffic light detection failed: {e}")
 
-        # Convert to OpenCV format
-        image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    return detect_traffic_light_array(image, os.path.basename(image_path), output_dir)
 
+
+def detect_traffic_light_array(image, filename, output_dir="output", letterboxed=None, render=None, tiled=None):
+    """
+    Run detection on an already-decoded BGR uint8 image (see detectors/image_io.py).
+    ``filename`` only names the annotated output; boxes are drawn onto ``image`` in place
+    unless ``render`` (see detectors/rendering.py) is "none" or "deferred".
+    Pass a shared ``letterboxed`` (detectors/letterbox.py) to skip the per-model resize;
+    boxes are still reported in ``image`` coordinates. ``tiled`` overrides the
+    TRAFFIC_LIGHT_TILED / TILED_INFERENCE mode (see detectors/tiling.py); tiled runs
+    ignore ``letterboxed``.
+    """
+    try:
         # Run detection using YOLOv8 (lazy-loaded) with tunable thresholds
         model = _get_model()
         conf = float(os.getenv("TRAFFIC_LIGHT_CONF", "0.25"))
         iou = float(os.getenv("TRAFFIC_LIGHT_IOU", "0.45"))
-        results = model(image, conf=conf, iou=iou)  # Accepts numpy array
-        result = results[0]
-
-        detections = []
-
-        if result.boxes is not None:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                conf = round(box.conf[0].item(), 2)
-                cls = int(box.cls[0].item())
-                label = model.names[cls]
-
-                detections.append({
-                    "label": label,
-                    "confidence": conf,
-                    "bbox": [x1, y1, x2, y2]
-                })
-
-                # Draw on image
-                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(image, f"{label} {conf}", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        # Save result image to /output with a _light suffix for clarity
-        original = os.path.basename(image_path)
+        started = time.perf_counter()
+        # Batched with concurrent requests for the same model (see detectors/batching.py)
+        batcher = get_batcher("traffic_light", _predict_batch, "TRAFFIC_LIGHT")
+        if use_tiling(image, "TRAFFIC_LIGHT", tiled):
+            # Overlapping TILE_SIZE tiles of the full-resolution frame, merged back into image coordinates
+            result, letterboxed = predict_tiled(batcher, image, conf, iou), None
+        else:
+            model_input = letterboxed.image if letterboxed is not None else image
+            result = batcher.predict(model_input, conf, iou)
+        predicted = time.perf_counter()
+
+        # One NumPy copy of the boxes, filtered and formatted in bulk (see detectors/postprocess.py);
+        # boxes are (x1, y1, x2, y2, text) to draw
+        detections, boxes = build_detections(result, model.names, letterboxed, **postprocess_config("TRAFFIC_LIGHT"))
+        record_inference(result, predicted - started, time.perf_counter() - predicted)
+
+        # Annotated image: written to /output with a _light suffix, deferred, inlined or skipped per render mode
+        original = os.path.basename(filename)
         stem, ext = os.path.splitext(original)
-        filename = f"{stem}_light{ext}"
-        output_path = os.path.join(OUTPUT_DIR, filename)
-        cv2.imwrite(output_path, image)
+        filename = render_output(image, lambda canvas: draw_boxes(canvas, boxes, (0, 255, 0)), f"{stem}_light{ext}", render)
 
-        print(f"✅ Processed: {filename} → {output_path}")
+        print(f"✅ Processed: {original} → {filename if isinstance(filename, str) else render}")
         print(f"✅ Found {len(detections)} traffic lights")
         return detections, filename
         
@@ -0,0 +1,69 @@
+import os
+import cv2
+
+VIDEO_FORMATS = [".mp4", ".mov", ".avi", ".mkv", ".m4v"]
+# Used when a request gives neither a frame stride nor a time interval
+DEFAULT_INTERVAL_SECONDS = float(os.getenv("VIDEO_SAMPLE_INTERVAL", "1.0"))
+
+
+def check_video_format(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in VIDEO_FORMATS:
+        raise ValueError(f"Unsupported video format: {ext}. Supported formats: {VIDEO_FORMATS}")
+    return ext
+
+
+def open_video(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        capture.release()
+        raise ValueError("Failed to open video: could not decode container")
+    return capture
+
+
+def video_info(capture):
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    return {
+        "fps": round(fps, 3) if fps and fps > 0 else None,
+        "frame_count": int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None,
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+
+
+def sample_frames(capture, stride=None, interval=None, max_frames=None):
+    """
+    Yield ``(frame_index, timestamp_ms, bgr_frame)`` for every ``stride``-th frame, or
+    for the first frame at or after each ``interval`` seconds of video time. Skipped
+    frames are only grabbed: with the FFmpeg backend grab() still decodes them (later
+    frames depend on them), but retrieve()'s colour conversion and copy into a BGR array
+    is skipped. Only one retrieved frame is alive at a time, so memory doesn't grow with
+    video length.
+    """
+    if not stride and not interval:
+        interval = DEFAULT_INTERVAL_SECONDS
+    next_ms = 0.0
+    sampled = 0
+    index = -1
+    try:
+        while max_frames is None or sampled < max_frames:
+            if not capture.grab():
+                break
+            index += 1
+            timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if stride:
+                if index % stride:
+                    continue
+            elif timestamp_ms + 1e-3 < next_ms:
+                continue
+            else:
+                next_ms += interval * 1000
+                while next_ms <= timestamp_ms:  # gaps in variable-frame-rate video
+                    next_ms += interval * 1000
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            sampled += 1
+            yield index, round(timestamp_ms, 1), frame
+    finally:
+        capture.release()
@@ -0,0 +1,125 @@
+import os
+import asyncio
+import contextvars
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per detector with <NAME>_INFERENCE_WORKERS / <NAME>_INFERENCE_QUEUE_SIZE
+# (e.g. LIGHT_INFERENCE_WORKERS=2, PAVEMENT_INFERENCE_QUEUE_SIZE=4)
+DEFAULT_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+DEFAULT_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER", "2"))
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class DetectorOverloaded(Exception):
+    """Raised when a detector's admission queue is full; the caller should answer 503 + Retry-After."""
+
+    def __init__(self, name, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__(f"{name} detector is saturated, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs blocking detector work for one detector in a sized thread pool so the
+    asyncio event loop (and /healthz) stays responsive.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that is rejected with DetectorOverloaded.
+    """
+
+    def __init__(self, name, max_workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"infer-{name}")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.max_queue
+
+    def _admit(self):
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._rejected += 1
+                raise DetectorOverloaded(self.name)
+            self._admitted += 1
+
+    def _release(self):
+        with self._lock:
+            self._admitted -= 1
+            self._completed += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """``run`` for blocking callers: a concurrent Future, or DetectorOverloaded if the queue is full."""
+        self._admit()
+        # Run in a copy of the caller's context so per-request metrics labels follow the work
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the work is done (or cancelled before it started), not when the caller
+        # stops waiting: a disconnected client's image still holds its slot while it runs
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool, or raise DetectorOverloaded if the queue is full."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._admitted, self.max_workers),
+                "queued": max(0, self._admitted - self.max_workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_executor(name):
+    """Return the executor for a detector (e.g. "light", "sign_damage"), created from env config on first use."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                prefix = name.upper()
+                workers = int(os.getenv(f"{prefix}_INFERENCE_WORKERS", DEFAULT_WORKERS))
+                queue_size = int(os.getenv(f"{prefix}_INFERENCE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+                executor = InferenceExecutor(name, workers, queue_size)
+                _executors[name] = executor
+                logger.info(f"✅ Inference executor for {name}: workers={workers}, queue={queue_size}")
+    return executor
+
+
+def executor_stats():
+    with _executors_lock:
+        return {name: e.stats() for name, e in _executors.items()}
+
+
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+import logging
+from itertools import islice
+
+from detectors.archive import ResultWriter, count_members, iter_members, process_members
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Persistent batch jobs: POST /jobs stores the input under JOBS_DIR and a row in JOBS_DB; worker
+# threads claim queued jobs, run them through the archive pipeline (detectors/archive.py) and
+# checkpoint the CSV + counters every ARCHIVE_PROGRESS_SECONDS, so a restart resumes where it stopped.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(BASE_DIR, "jobs"))
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(JOBS_DIR, "jobs.db"))
+# Jobs run at once per server process; 0 = accept jobs but run none here (e.g. API-only replicas)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Images decoded + inferred at once within one job. Kept low so jobs leave the CPUs to
+# interactive requests; raise it on a dedicated batch replica.
+JOB_THREADS = int(os.getenv("JOB_THREADS", "1"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# A running job whose worker hasn't sent a heartbeat for this long (crashed / killed) is picked up
+# again; workers beat every JOB_STALE_SECONDS / 4, independently of progress
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    detectors TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    input_name TEXT NOT NULL,
+    total INTEGER,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    result_bytes INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    lease TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+_PUBLIC_FIELDS = (
+    "id", "status", "detectors", "input_name", "total", "processed", "failed", "rows", "error",
+    "attempts", "cancel_requested", "created_at", "started_at", "updated_at", "finished_at",
+)
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+_wake = threading.Event()
+_started = False
+
+
+def _connect():
+    """One connection per thread; WAL so readers (GET /jobs/{id}) never wait on a checkpoint."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOBS_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(_SCHEMA)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+                if "lease" not in columns:  # database from before leases
+                    conn.execute("ALTER TABLE jobs ADD COLUMN lease TEXT")
+                _initialized = True
+        _local.conn = conn
+    return conn
+
+
+def job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def input_path(job_id, kind):
+    # tarfile sniffs the compression itself, so one name per kind is enough
+    return os.path.join(job_dir(job_id), {"zip": "input.zip", "tar": "input.tar", "manifest": "input.txt"}[kind])
+
+
+def result_path(job_id):
+    return os.path.join(job_dir(job_id), "results.csv")
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def create_job(job_id, detectors, kind, input_name):
+    """Queue a job whose input is already at ``input_path(job_id, kind)``."""
+    now = time.time()
+    total = count_members(input_path(job_id, kind), kind)
+    _connect().execute(
+        "INSERT INTO jobs (id, status, detectors, kind, input_name, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (job_id, QUEUED, json.dumps(detectors), kind, input_name, total, now, now),
+    )
+    _wake.set()
+    return get_job(job_id)
+
+
+def get_job(job_id):
+    row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = {field: row[field] for field in _PUBLIC_FIELDS}
+    job["detectors"] = json.loads(job["detectors"])
+    return job
+
+
+def list_jobs(status=None, limit=100):
+    query, args = "SELECT id FROM jobs", ()
+    if status:
+        query, args = query + " WHERE status = ?", (status,)
+    rows = _connect().execute(query + " ORDER BY created_at DESC LIMIT ?", (*args, limit)).fetchall()
+    return [get_job(row["id"]) for row in rows]
+
+
+def cancel_job(job_id):
+    """
+    Cancel a job. A queued one is cancelled at once; a running one is flagged and its worker
+    stops (and marks it cancelled) at the next checkpoint. Returns the job or None.
+    """
+    now = time.time()
+    conn = _connect()
+    conn.execute(
+        "UPDATE jobs SET status = ?, updated_at = ?, finished_at = ? WHERE id = ? AND status = ?",
+        (CANCELLED, now, now, job_id, QUEUED),
+    )
+    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+    return get_job(job_id)
+
+
+def delete_job(job_id):
+    """Remove a finished job's row and files; False if it is unknown or still active."""
+    placeholders = ", ".join("?" * len(TERMINAL))
+    cursor = _connect().execute(
+        f"DELETE FROM jobs WHERE id = ? AND status IN ({placeholders})", (job_id, *TERMINAL)
+    )
+    if not cursor.rowcount:
+        return False
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    return True
+
+
+def _claim():
+    """
+    Atomically take the oldest queued job, or a running one whose worker stopped sending
+    heartbeats, under a fresh lease token. Every later write of this worker requires the
+    token, so a worker whose job was reclaimed can't touch it any more.
+    """
+    now = time.time()
+    row = _connect().execute(
+        """
+        UPDATE jobs SET status = ?, lease = ?, attempts = attempts + 1, started_at = COALESCE(started_at, ?), updated_at = ?
+        WHERE id = (
+            SELECT id FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?)
+            ORDER BY created_at LIMIT 1
+        )
+        RETURNING *
+        """,
+        (RUNNING, uuid.uuid4().hex, now, now, QUEUED, RUNNING, now - JOB_STALE_SECONDS),
+    ).fetchone()
+    return row
+
+
+class _Heartbeat:
+    """Refreshes a claimed job's ``updated_at`` on its own thread, so a slow image (model download, export) can't make it look stale."""
+
+    def __init__(self, job_id, lease):
+        self.job_id = job_id
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(JOB_STALE_SECONDS / 4):
+            try:
+                cursor = _connect().execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND lease = ? AND status = ?",
+                    (time.time(), self.job_id, self.lease, RUNNING),
+                )
+            except sqlite3.Error as e:
+                logger.error(f"❌ Heartbeat for job {self.job_id} failed: {e}")
+                continue
+            if not cursor.rowcount:
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _checkpoint(job_id, lease, base, update, writer):
+    """Persist counters + CSV size. Returns None, or why the worker must stop: "cancelled" or "lost" (reclaimed)."""
+    cursor = _connect().execute(
+        "UPDATE jobs SET processed = ?, failed = ?, rows = ?, result_bytes = ?, updated_at = ? "
+        "WHERE id = ? AND lease = ? AND status = ? AND NOT cancel_requested",
+        (
+            base["processed"] + update["processed"], base["failed"] + update["failed"],
+            base["rows"] + update["rows"], writer.checkpoint(), time.time(), job_id, lease, RUNNING,
+        ),
+    )
+    if cursor.rowcount == 1:
+        return None
+    row = _connect().execute("SELECT lease, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return "cancelled" if row is not None and row["lease"] == lease and row["status"] == RUNNING else "lost"
+
+
+def _finish(job_id, lease, status, error=None):
+    now = time.time()
+    _connect().execute(
+        "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ? AND lease = ? AND status = ?",
+        (status, error, now, now, job_id, lease, RUNNING),
+    )
+
+
+def _run(job, analyzer_for):
+    """
+    Run one claimed job. On a resume the CSV is cut back to its last checkpoint and that
+    many members are skipped, so each image appears in the results exactly once.
+    """
+    job_id, kind, lease = job["id"], job["kind"], job["lease"]
+    if job["cancel_requested"]:  # its previous worker died before it could stop
+        _finish(job_id, lease, CANCELLED)
+        return
+    path = result_path(job_id)
+    base = {"processed": job["processed"], "failed": job["failed"], "rows": job["rows"]}
+    resume = job["result_bytes"] > 0 and os.path.exists(path)
+    if resume:
+        with open(path, "r+b") as f:
+            f.truncate(job["result_bytes"])
+        logger.info(f"🔁 Resuming job {job_id} after {base['processed']} images (attempt {job['attempts']})")
+    else:
+        base = {"processed": 0, "failed": 0, "rows": 0}
+
+    writer = ResultWriter(path, "csv", append=resume)
+    stopped = None
+    try:
+        with _Heartbeat(job_id, lease) as heartbeat:
+            members = islice(iter_members(input_path(job_id, kind), kind), base["processed"], None)
+            updates = process_members(members, analyzer_for(json.loads(job["detectors"])), writer, workers=JOB_THREADS)
+            for update in updates:
+                stopped = "lost" if heartbeat.lost.is_set() else _checkpoint(job_id, lease, base, update, writer)
+                if stopped:
+                    updates.close()  # drops the queued images
+                    break
+    finally:
+        writer.close()
+    if stopped == "lost":
+        # Another worker reclaimed the job and owns its files now
+        logger.error(f"⚠️ Lost the lease on job {job_id}; leaving it to its new worker")
+        return
+    _finish(job_id, lease, CANCELLED if stopped else DONE)
+    if stopped:
+        logger.info(f"🛑 Job {job_id} cancelled")
+    else:
+        logger.info(f"✅ Job {job_id} done")
+    try:
+        os.remove(input_path(job_id, kind))
+    except OSError:
+        pass
+
+
+def _worker(analyzer_for):
+    while True:
+        try:
+            job = _claim()
+        except Exception as e:
+            logger.error(f"❌ Job queue unavailable: {e}")
+            job = None
+        if job is None:
+            _wake.wait(JOB_POLL_SECONDS)
+            _wake.clear()
+            continue
+        try:
+            _run(job, analyzer_for)
+        except Exception as e:
+            logger.error(f"❌ Job {job['id']} failed: {e}")
+            _finish(job["id"], job["lease"], FAILED, str(e))
+
+
+def start_job_workers(analyzer_for):
+    """
+    Start JOB_WORKERS daemon threads pulling jobs from the queue. ``analyzer_for(detectors)``
+    returns the per-image ``analyze(name, data) -> (rows, ok)`` used by process_members.
+    """
+    global _started
+    if _started or JOB_WORKERS <= 0:
+        return 0
+    _started = True
+    _connect()
+    for index in range(JOB_WORKERS):
+        threading.Thread(target=_worker, args=(analyzer_for,), name=f"job-worker-{index}", daemon=True).start()
+    return JOB_WORKERS
+
+
+def job_stats():
+    counts = dict(_connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    return {"workers": JOB_WORKERS if _started else 0, "threads_per_job": JOB_THREADS, **{s: counts.get(s, 0) for s in (QUEUED, RUNNING, *TERMINAL)}}
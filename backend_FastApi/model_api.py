@@ -1,22 +1,61 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import Response, FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Query, Request
+from fastapi.responses import Response, FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+from typing import List
 import os
-import shutil
+import time
+import asyncio
+import threading
 import cv2
 import base64
+import json
+import shutil
+import contextlib
+import functools
+from itertools import islice
 
-from detectors.trafficLightdetection import detect_traffic_light
-from detectors.trafficsign_detection import detect_traffic_sign
-from detectors.roadway_illumination_detection import detect_roadway_illumination
-from detectors.traffic_sign_damage_detection import detect_traffic_sign_damage
-from detectors.traffic_signal_damage_detection import detect_traffic_signal_damage
-from detectors.pavement_marking_detection import detect_pavement_marking
+from detectors.archive import (
+    ARCHIVE_MAX_BYTES, archive_kind, check_output_format, count_members, detection_rows,
+    iter_members, process_members, result_filename, ResultWriter,
+)
+from detectors.batching import batching_stats
+from detectors.detection_store import DETECTIONS_QUERY_LIMIT, query_detections, record_detections, shutdown_store, store_stats
+from detectors.image_io import decode_reduced
+from detectors.ingest import MULTIPART_OVERHEAD, UPLOAD_MAX_BYTES, BodyLimitMiddleware, UploadRejected, inspect_image, read_image_upload
+from detectors.letterbox import letterbox
+from detectors.metrics import MetricsMiddleware, detector_scope, observe_stage, observe_upload, render_metrics
+from detectors.postprocess import decode_scope, rescale_detections
+from detectors.registry import DETECTORS, PRELOAD_IMPORTS, bind, decode_target, detector_module, shared_decode_target, start_import_preload
+from detectors.rendering import RENDER_MODES, check_render_mode, is_pending, render_stats, shutdown_renderer
+from detectors.result_cache import cached_detect, cache_stats
+from detectors.signal_inventory import MAX_ZOOM, get_inventory, tile_cells, viewport_cells
+from detectors.storage import OUTPUT_DIR, register_output, scoped_filename, start_storage, storage_stats, temp_file
+from detectors.video import check_video_format, open_video, sample_frames, video_info
+from inference_executor import DetectorOverloaded, get_executor, executor_stats, shutdown_executors
+import jobs
+from model_warmup import WARMUP_ON_STARTUP, readiness, start_warmup, track_lazy_loads
 
 app = FastAPI()
 origins_env = os.getenv("CORS_ORIGINS", "*")
 allow_origins = [o.strip() for o in origins_env.split(",") if o.strip()] or ["*"]
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+PAVEMENT_BATCH_MAX_BYTES = int(os.getenv("PAVEMENT_BATCH_MAX_BYTES", str(256 * 1024 * 1024)))
+# Browser / CDN cache lifetime of /signals responses; revalidation is a cheap 304 via the inventory's ETag
+SIGNAL_TILES_MAX_AGE = int(os.getenv("SIGNAL_TILES_MAX_AGE", "60"))
+# 413 for bodies over the route's limit before they are read or spooled (see detectors/ingest.py)
+app.add_middleware(
+    BodyLimitMiddleware,
+    default=UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD,
+    limits={
+        "/analyze/video": VIDEO_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/analyze/pavement/batch": PAVEMENT_BATCH_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/analyze/archive": ARCHIVE_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/jobs": ARCHIVE_MAX_BYTES + MULTIPART_OVERHEAD,
+    },
+)
+# Added after BodyLimitMiddleware so it wraps it: the 413 carries CORS headers and browsers can read it
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
@@ -24,42 +63,124 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request counts, in-flight requests and latency per endpoint for /metrics
+app.add_middleware(MetricsMiddleware)
 os.makedirs("output", exist_ok=True)
 app.mount("/output", StaticFiles(directory="output"), name="output")
 
-def save_temp_file(file):
-    os.makedirs("temp", exist_ok=True)
-    path = os.path.join("temp", file.filename)
-    print(f"🔍 Debug: save_temp_file - filename: {file.filename}")
-    print(f"🔍 Debug: save_temp_file - path: {path}")
-    print(f"🔍 Debug: save_temp_file - content_type: {file.content_type}")
-    
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    
-    print(f"🔍 Debug: save_temp_file - file saved, size: {os.path.getsize(path)}")
-    return path
+# Detector name -> analyzer. The names also select the inference executor, the per-detector
+# sections of /analyze/all and the models reported by /readyz. Each function imports its
+# detector module (and with it torch / ultralytics) on first call, see detectors/registry.py.
+ANALYZERS = {name: bind(name, spec.analyzer) for name, spec in DETECTORS.items()}
+# Model file + thresholds per detector; part of the result cache key
+MODEL_IDENTITIES = {name: bind(name, "model_identity") for name in DETECTORS}
+# Load + dummy forward pass per detector, used by the opt-in startup warm-up
+WARMUPS = {name: bind(name, "warmup") for name in DETECTORS}
+# Models loaded by a request rather than the warm-up still show up in /readyz
+track_lazy_loads({spec.model: name for name, spec in DETECTORS.items()})
+# YOLO detectors accept the shared letterboxed frame; pavement (FastCNN) does its own resize
+YOLO_ANALYZERS = {"light", "sign", "illumination", "sign_damage", "signal_damage"}
+# ?render= on every /analyze/* endpoint; RENDER_MODE sets the default (see detectors/rendering.py)
+RENDER_PATTERN = "^(" + "|".join(RENDER_MODES) + ")$"
+RENDER_DESCRIPTION = "Annotated image: file (written to /output), none, deferred (written in the background) or inline (base64)"
+
+@app.on_event("startup")
+def _start_warmup():
+    start_storage()
+    if WARMUP_ON_STARTUP:
+        names = start_warmup(WARMUPS)
+        print(f"🔥 Warming up models in the background: {names}")
+    elif PRELOAD_IMPORTS:
+        start_import_preload()
+    workers = jobs.start_job_workers(_job_analyzer)
+    if workers:
+        print(f"🚀 Started {workers} job workers ({jobs.JOB_THREADS} threads each)")
+
+@app.on_event("shutdown")
+def _shutdown_executors():
+    shutdown_executors()
+    shutdown_renderer()
+    shutdown_store()
+
+def _identity(name, target):
+    """Result cache identity: the detector's model + thresholds and the decode scale target."""
+    return {**MODEL_IDENTITIES[name](), "decode": target}
+
+def _decode_and_detect(name, upload, render):
+    """
+    Blocking part of an /analyze/* request; runs on the detector's inference executor.
+    ``upload`` already passed the ingestion checks (see detectors/ingest.py). Re-submitted
+    images are served from the result cache; otherwise the upload bytes are decoded in
+    memory, so no temp file is written on the hot path.
+    """
+    data, filename, digest = upload.data, upload.filename, upload.digest
+    # Outputs are named <stem>_<content hash or uuid>_<suffix><ext>, never the bare upload name
+    output_name = scoped_filename(filename, digest)
+    # Large JPEGs decode at a reduced scale still >= the model input; boxes are mapped back to full resolution
+    target = decode_target(name)
+
+    def run():
+        start = time.perf_counter()
+        image, source_size = decode_reduced(data, *(target or ()))
+        observe_stage("decode", time.perf_counter() - start)
+        print(f"🔍 Debug: Decoded {filename}: {image.shape[1]}x{image.shape[0]} (source {source_size[0]}x{source_size[1]})")
+        with decode_scope(image.shape, source_size):
+            detections, output = ANALYZERS[name](image, output_name, render=render)
+        return rescale_detections(detections, image.shape, source_size), output
+
+    with detector_scope(name):
+        detections, output = cached_detect(name, digest, output_name, _identity(name, target), run, render)
+    record_detections(upload, name, detections)  # geotagged uploads only
+    return detections, output
+
+def _overloaded_response(e):
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(e)},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+def _rejected_response(e):
+    return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+
+def _output_urls(output_filename):
+    base_url = os.getenv("PUBLIC_BASE_URL", "")
+    return {
+        "image_url": f"/output/{output_filename}",
+        "image_url_absolute": f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}",
+    }
+
+def _output_fields(output):
+    """Response fields for a detector's annotated-image ``output`` under each render mode."""
+    if output is None:  # render=none
+        return {"image_url": None, "image_url_absolute": None}
+    if isinstance(output, dict):  # render=inline
+        return {"image_url": None, "image_url_absolute": None, "image_inline": output}
+    fields = _output_urls(output)
+    if is_pending(output):  # render=deferred: the URL serves once the background render lands
+        fields["image_pending"] = True
+    return fields
 
 @app.post("/analyze/light")
-async def analyze_light(file: UploadFile = File(...)):
+async def analyze_light(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
         print(f"🔍 Debug: Received file: {file.filename}, content_type: {file.content_type}")
         
-        path = save_temp_file(file)  # Save the uploaded file to disk
-        print(f"🔍 Debug: Saved file to: {path}")
-        print(f"🔍 Debug: File exists: {os.path.exists(path)}")
-        print(f"🔍 Debug: File size: {os.path.getsize(path) if os.path.exists(path) else 'N/A'}")
-
-        detections, output_filename = detect_traffic_light(path)  # Pass the file path
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
-
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
-        })
+        upload = await read_image_upload(file)
+        observe_upload()
+        # Decode + detect off the event loop; raises DetectorOverloaded when the queue is full
+        detections, output = await get_executor("light").run(
+            _decode_and_detect, "light", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
         print(f"❌ Error in analyze_light: {e}")
@@ -68,43 +189,46 @@ async def analyze_light(file: UploadFile = File(...)):
 
 
 @app.post("/analyze/sign")
-async def analyze_sign(file: UploadFile = File(...)):
+async def analyze_sign(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
-        path = save_temp_file(file)
-
-        detections, output_filename = detect_traffic_sign(path)
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
-
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
-        })
+        upload = await read_image_upload(file)
+        observe_upload()
+        detections, output = await get_executor("sign").run(
+            _decode_and_detect, "sign", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/analyze/illumination")
-async def analyze_illumination(file: UploadFile = File(...)):
+async def analyze_illumination(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
         print(f"🔍 Debug: Received illumination file: {file.filename}, content_type: {file.content_type}")
         
-        path = save_temp_file(file)
-        print(f"🔍 Debug: Saved illumination file to: {path}")
-
-        detections, output_filename = detect_roadway_illumination(path)
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
-
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
-        })
+        upload = await read_image_upload(file)
+        observe_upload()
+        detections, output = await get_executor("illumination").run(
+            _decode_and_detect, "illumination", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
         print(f"❌ Error in analyze_illumination: {e}")
@@ -112,23 +236,24 @@ async def analyze_illumination(file: UploadFile = File(...)):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/analyze/sign_damage")
-async def analyze_sign_damage(file: UploadFile = File(...)):
+async def analyze_sign_damage(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
         print(f"🔍 Debug: Received sign damage file: {file.filename}, content_type: {file.content_type}")
         
-        path = save_temp_file(file)
-        print(f"🔍 Debug: Saved sign damage file to: {path}")
-
-        detections, output_filename = detect_traffic_sign_damage(path)
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
-
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
-        })
+        upload = await read_image_upload(file)
+        observe_upload()
+        detections, output = await get_executor("sign_damage").run(
+            _decode_and_detect, "sign_damage", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
         print(f"❌ Error in analyze_sign_damage: {e}")
@@ -136,23 +261,24 @@ async def analyze_sign_damage(file: UploadFile = File(...)):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/analyze/signal_damage")
-async def analyze_signal_damage(file: UploadFile = File(...)):
+async def analyze_signal_damage(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
         print(f"🔍 Debug: Received signal damage file: {file.filename}, content_type: {file.content_type}")
         
-        path = save_temp_file(file)
-        print(f"🔍 Debug: Saved signal damage file to: {path}")
-
-        detections, output_filename = detect_traffic_signal_damage(path)
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
-
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
-        })
+        upload = await read_image_upload(file)
+        observe_upload()
+        detections, output = await get_executor("signal_damage").run(
+            _decode_and_detect, "signal_damage", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
         print(f"❌ Error in analyze_signal_damage: {e}")
@@ -160,29 +286,686 @@ async def analyze_signal_damage(file: UploadFile = File(...)):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/analyze/pavement")
-async def analyze_pavement(file: UploadFile = File(...)):
+async def analyze_pavement(
+    file: UploadFile = File(...),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
     try:
         print(f"🔍 Debug: Received pavement marking file: {file.filename}, content_type: {file.content_type}")
         
-        path = save_temp_file(file)
-        print(f"🔍 Debug: Saved pavement marking file to: {path}")
+        upload = await read_image_upload(file)
+        observe_upload()
+        detections, output = await get_executor("pavement").run(
+            _decode_and_detect, "pavement", upload, check_render_mode(render)
+        )
+        return JSONResponse(content={"detections": detections, **_output_fields(output)})
 
-        detections, output_filename = detect_pavement_marking(path)
-        base_url = os.getenv("PUBLIC_BASE_URL", "")
-        absolute_url = f"{base_url}/output/{output_filename}" if base_url else f"/output/{output_filename}"
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        import traceback
+        print(f"❌ Error in analyze_pavement: {e}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+def _classify_pavement_uploads(uploads, render, batch_size):
+    """
+    Blocking part of /analyze/pavement/batch: decode every upload, then classify the
+    decodable ones in batches. ``uploads`` holds ``(filename, Upload or UploadRejected)``.
+    """
+    timings = {}
+    start = time.perf_counter()
+    images, filenames, errors = [], [], {}
+    target = decode_target("pavement") or ()
+    for index, (filename, upload) in enumerate(uploads):
+        if isinstance(upload, UploadRejected):
+            errors[index] = str(upload)
+            continue
+        try:
+            images.append(decode_reduced(upload.data, *target)[0])
+            filenames.append(scoped_filename(filename, upload.digest if render else None))
+        except Exception as e:
+            errors[index] = str(e)
+    timings["decode"] = round((time.perf_counter() - start) * 1000, 2)
+    observe_stage("decode", time.perf_counter() - start, detector="pavement")
+
+    start = time.perf_counter()
+    with detector_scope("pavement"):
+        outputs = detector_module("pavement").detect_pavement_marking_batch(
+            images, filenames, render=render, batch_size=batch_size
+        ) if images else []
+    timings["classify"] = round((time.perf_counter() - start) * 1000, 2)
 
-        return JSONResponse(content={
-            "detections": detections,
-            "image_url": f"/output/{output_filename}",
-            "image_url_absolute": absolute_url
+    results, classified = [], iter(outputs)
+    for index, (filename, upload) in enumerate(uploads):
+        if index in errors:
+            results.append({"filename": filename, "error": errors[index]})
+            continue
+        detections, output_filename = next(classified)
+        record_detections(upload, "pavement", detections, filename)
+        result = {"filename": filename, "detections": detections}
+        if output_filename:
+            result.update(_output_urls(output_filename))
+        results.append(result)
+    return results, timings
+
+@app.post("/analyze/pavement/batch")
+async def analyze_pavement_batch(
+    files: List[UploadFile] = File(...),
+    render: bool = Query(False, description="Also write an annotated copy of every image"),
+    batch_size: int = Query(None, ge=1, le=512, description="Images per forward pass (default PAVEMENT_BATCH_SIZE)"),
+):
+    """
+    Classify many pavement images in one request. Images are resized into one batch
+    buffer and run through FastCNN together; each result carries the label, its softmax
+    confidence and the full per-class probabilities. Undecodable files get a per-file error.
+    """
+    max_files = int(os.getenv("PAVEMENT_BATCH_MAX_FILES", "256"))
+    if len(files) > max_files:
+        return JSONResponse(status_code=400, content={
+            "error": f"Too many files: {len(files)}. At most {max_files} per request (PAVEMENT_BATCH_MAX_FILES)."
         })
 
+    try:
+        print(f"🔍 Debug: Received {len(files)} pavement images for batch classification")
+        start = time.perf_counter()
+        uploads = []
+        for f in files:
+            try:
+                uploads.append((f.filename, await read_image_upload(f)))
+            except UploadRejected as e:  # reported per file, like undecodable images
+                uploads.append((f.filename, e))
+        observe_upload()
+        results, timings = await get_executor("pavement").run(
+            _classify_pavement_uploads, uploads, render, batch_size
+        )
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        return JSONResponse(content={"results": results, "count": len(results), "timings_ms": timings})
+
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         import traceback
-        print(f"❌ Error in analyze_pavement: {e}")
+        print(f"❌ Error in analyze_pavement_batch: {e}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+class _SharedFrame:
+    """
+    One /analyze/all upload, decoded (and letterboxed for the YOLO models) at most once per
+    decode target (see detectors/registry.py), by whichever detector first misses the
+    result cache. The YOLO models share a target; FastCNN may get a smaller decode.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.data = upload.data
+        self.digest = upload.digest
+        self.source_size = None
+        self.decoded = {}  # decode target -> [image, letterboxed or None]
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def get(self, target, with_letterbox):
+        with self._lock:
+            decoded = self.decoded.get(target)
+            if decoded is None:
+                start = time.perf_counter()
+                image, self.source_size = decode_reduced(self.data, *(target or ()))
+                decoded = self.decoded[target] = [image, None]
+                self.timings["decode"] = round(self.timings.get("decode", 0) + (time.perf_counter() - start) * 1000, 2)
+                observe_stage("decode", time.perf_counter() - start, detector="")  # shared by all sections
+            if with_letterbox and decoded[1] is None:
+                start = time.perf_counter()
+                decoded[1] = letterbox(decoded[0])
+                self.timings["letterbox"] = round(self.timings.get("letterbox", 0) + (time.perf_counter() - start) * 1000, 2)
+                observe_stage("preprocess", time.perf_counter() - start, detector="")
+        return decoded[0], decoded[1], self.source_size
+
+def _run_section(name, frame, filename, render):
+    """Run one detector of /analyze/all; YOLO detectors draw in place, so they get their own canvas."""
+    start = time.perf_counter()
+    target = decode_target(name)
+
+    def run():
+        if name in YOLO_ANALYZERS:
+            image, letterboxed, source_size = frame.get(target, with_letterbox=True)
+            canvas = image if render == "none" else image.copy()  # nothing is drawn with render=none
+            with decode_scope(image.shape, source_size):
+                detections, output = ANALYZERS[name](canvas, filename, letterboxed=letterboxed, render=render)
+        else:
+            image, _, source_size = frame.get(target, with_letterbox=False)
+            with decode_scope(image.shape, source_size):
+                detections, output = ANALYZERS[name](image, filename, render=render)
+        return rescale_detections(detections, image.shape, source_size), output
+
+    with detector_scope(name):
+        detections, output = cached_detect(name, frame.digest, filename, _identity(name, target), run, render)
+    record_detections(frame.upload, name, detections)
+    elapsed = round((time.perf_counter() - start) * 1000, 2)
+    return {"detections": detections, **_output_fields(output), "timing_ms": elapsed}
+
+def _parse_detectors(detectors):
+    """``?detectors=a,b`` -> (names, None), or (None, 400 response) for unknown names."""
+    names = [n.strip() for n in detectors.split(",") if n.strip()] if detectors else list(ANALYZERS)
+    unknown = [n for n in names if n not in ANALYZERS]
+    if unknown or not names:
+        return None, JSONResponse(status_code=400, content={
+            "error": f"Unknown detectors: {unknown}. Choose from: {list(ANALYZERS)}"
+        })
+    return list(dict.fromkeys(names)), None
+
+@app.post("/analyze/all")
+async def analyze_all(
+    file: UploadFile = File(...),
+    detectors: str = Query(None, description="Comma-separated subset of: " + ", ".join(ANALYZERS)),
+    render: str = Query(None, pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
+    """
+    Decode one upload once and run several detectors on it concurrently. The five YOLO
+    models share one letterboxed frame; each gets its own section with detections,
+    annotated image URL and timing.
+    """
+    names, error = _parse_detectors(detectors)
+    if error:
+        return error
+
+    try:
+        print(f"🔍 Debug: Received file for {names}: {file.filename}, content_type: {file.content_type}")
+        start = time.perf_counter()
+        upload = await read_image_upload(file)
+        observe_upload()
+        frame = _SharedFrame(upload)
+        render = check_render_mode(render)
+        output_name = scoped_filename(file.filename, frame.digest)
+
+        async def run_one(name):
+            try:
+                return await get_executor(name).run(_run_section, name, frame, output_name, render)
+            except DetectorOverloaded:
+                raise
+            except Exception as e:
+                print(f"❌ Error in analyze_all [{name}]: {e}")
+                return {"error": str(e)}
+
+        sections = await asyncio.gather(*(run_one(n) for n in names))
+        timings = {**frame.timings, "total": round((time.perf_counter() - start) * 1000, 2)}
+
+        content = {"detectors": dict(zip(names, sections)), "timings_ms": timings}
+        if frame.source_size is not None:  # None when every section was a cache hit
+            content["image"] = {"width": int(frame.source_size[0]), "height": int(frame.source_size[1])}
+        return JSONResponse(content=content)
+
+    except DetectorOverloaded as e:
+        return _overloaded_response(e)
+    except UploadRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        import traceback
+        print(f"❌ Error in analyze_all: {e}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+def _detect_frame(names, image, frame_name, render):
+    """Run the selected detectors on one decoded video frame or archive image (letterboxed once for the YOLO models)."""
+    letterboxed = None
+    if YOLO_ANALYZERS.intersection(names):
+        start = time.perf_counter()
+        letterboxed = letterbox(image)
+        observe_stage("preprocess", time.perf_counter() - start, detector="")
+    sections = {}
+    for name in names:
+        start = time.perf_counter()
+        try:
+            with detector_scope(name):
+                if name in YOLO_ANALYZERS:
+                    canvas = image if render == "none" else image.copy()
+                    detections, output = ANALYZERS[name](canvas, frame_name, letterboxed=letterboxed, render=render)
+                else:
+                    detections, output = ANALYZERS[name](image, frame_name, render=render)
+            sections[name] = {
+                "detections": detections,
+                **_output_fields(output),
+                "timing_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        except Exception as e:
+            print(f"❌ Error in {name} detector on {frame_name}: {e}")
+            sections[name] = {"error": str(e)}
+    return sections
+
+async def _run_frame_with_backpressure(names, image, frame_name, render):
+    # Videos wait for a free slot instead of failing mid-stream with 503
+    while True:
+        try:
+            return await get_executor("video").run(_detect_frame, names, image, frame_name, render)
+        except DetectorOverloaded:
+            await asyncio.sleep(0.05)
+
+async def _spool_upload(file, path, max_bytes, too_large):
+    """Copy an upload to ``path`` in chunks (never whole in memory); UploadRejected(413) past ``max_bytes``."""
+    written = 0
+    write_seconds = 0.0
+    with open(path, "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadRejected(413, f"{too_large} ({max_bytes} bytes)")
+            start = time.perf_counter()
+            f.write(chunk)
+            write_seconds += time.perf_counter() - start
+    observe_upload()
+    observe_stage("temp_write", write_seconds, detector="")
+    return written
+
+def _format_event(event, payload, stream_format):
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, **payload}) + "\n"
+
+async def _stream_video(cleanup, path, names, stride, interval, max_frames, render, stream_format, frame_stem):
+    """
+    Decode sampled frames ``VIDEO_BATCH_SIZE`` at a time, run each batch concurrently on
+    the "video" executor (so the per-model micro-batchers see whole batches) and emit
+    one event per frame, in order, as soon as its batch is done.
+    """
+    batch_size = max(1, int(os.getenv("VIDEO_BATCH_SIZE", "8")))
+    start = time.perf_counter()
+    processed = 0
+    try:
+        capture = await asyncio.to_thread(open_video, path)
+        yield _format_event("start", {"video": video_info(capture), "detectors": names}, stream_format)
+
+        frames = sample_frames(capture, stride=stride, interval=interval, max_frames=max_frames)
+        while True:
+            batch = await asyncio.to_thread(lambda: list(islice(frames, batch_size)))
+            if not batch:
+                break
+            sections = await asyncio.gather(*(
+                _run_frame_with_backpressure(names, image, f"{frame_stem}_f{index:06d}.jpg", render)
+                for index, _, image in batch
+            ))
+            for (index, timestamp_ms, _), detectors in zip(batch, sections):
+                processed += 1
+                yield _format_event("frame", {
+                    "frame": index, "timestamp_ms": timestamp_ms, "detectors": detectors
+                }, stream_format)
+            del batch
+
+        yield _format_event("end", {
+            "frames_processed": processed,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }, stream_format)
+    except Exception as e:
+        print(f"❌ Error in analyze_video: {e}")
+        yield _format_event("error", {"error": str(e), "frames_processed": processed}, stream_format)
+    finally:
+        cleanup.close()
+
+@app.post("/analyze/video")
+async def analyze_video(
+    file: UploadFile = File(...),
+    detectors: str = Query(None, description="Comma-separated subset of: " + ", ".join(ANALYZERS)),
+    stride: int = Query(None, ge=1, description="Analyze every Nth frame"),
+    interval: float = Query(None, gt=0, description="Analyze one frame per this many seconds of video (default VIDEO_SAMPLE_INTERVAL)"),
+    max_frames: int = Query(None, ge=1, description="Stop after this many sampled frames"),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="ndjson or sse (text/event-stream)"),
+    render: str = Query("none", pattern=RENDER_PATTERN, description=RENDER_DESCRIPTION),
+):
+    """
+    Stream a dashcam video (mp4/mov/avi/mkv) through the selected detectors, sampling
+    frames by stride or by time interval. Results stream back per frame while the video
+    is still being processed; the upload is spooled to a temp file removed at the end.
+    """
+    names, error = _parse_detectors(detectors)
+    if error:
+        return error
+    try:
+        check_video_format(file.filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    cleanup = contextlib.ExitStack()
+    try:
+        print(f"🔍 Debug: Received video for {names}: {file.filename}, content_type: {file.content_type}")
+        path = cleanup.enter_context(temp_file(file.filename))
+        await _spool_upload(file, path, VIDEO_MAX_BYTES, "Video larger than VIDEO_MAX_BYTES")
+    except UploadRejected as e:
+        cleanup.close()
+        return _rejected_response(e)
+    except Exception as e:
+        cleanup.close()
+        import traceback
+        print(f"❌ Error in analyze_video: {e}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    frame_stem = os.path.splitext(scoped_filename(file.filename))[0]
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_video(cleanup, path, names, stride, interval, max_frames, check_render_mode(render), stream_format, frame_stem),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(cleanup.close),  # also covers clients that disconnect early
+    )
+
+def _analyze_member(names, target, name, data):
+    """
+    One archive member: ingestion checks, decode, the selected detectors, result rows.
+    Returns ``(rows, ok)``; a bad image becomes a single error row instead of failing the run.
+    """
+    try:
+        if isinstance(data, Exception):
+            raise data
+        upload = inspect_image(name, data)
+        start = time.perf_counter()
+        image, source_size = decode_reduced(upload.data, *(target or ()))
+        observe_stage("decode", time.perf_counter() - start)
+    except Exception as e:
+        return [{"image": name, "error": str(e)}], False
+    with decode_scope(image.shape, source_size):
+        sections = _detect_frame(names, image, name, "none")
+    for detector, section in sections.items():
+        if "detections" in section:
+            rescale_detections(section["detections"], image.shape, source_size)
+            record_detections(upload, detector, section["detections"], name)
+    return detection_rows(name, sections, source_size), True
+
+def _submit_archive_member(fn, *args):
+    """
+    Queue one archive member on the shared "archive" executor, so concurrent archives are
+    bounded together and leave the CPUs to /analyze/*. Waits for a free slot instead of
+    failing mid-stream with 503.
+    """
+    executor = get_executor("archive")
+    while True:
+        try:
+            return executor.submit(fn, *args)
+        except DetectorOverloaded:
+            time.sleep(0.05)
+
+def _stream_archive(cleanup, path, kind, names, output, result_name, stream_format):
+    """
+    Run every image in the archive through ``process_members`` and stream progress events;
+    rows go straight to output/<result_name>, whose URL comes with the final event.
+    Runs in Starlette's threadpool (a plain generator), so the blocking work stays off the event loop.
+    """
+    summary = {"processed": 0, "failed": 0, "rows": 0}
+    try:
+        total = count_members(path, kind)
+        yield _format_event("start", {"detectors": names, "total": total, "output": output}, stream_format)
+
+        result_path = os.path.join(OUTPUT_DIR, result_name)
+        writer = ResultWriter(result_path, output)
+        analyze = functools.partial(_analyze_member, names, shared_decode_target(names))
+        try:
+            workers = get_executor("archive").max_workers
+            for update in process_members(iter_members(path, kind), analyze, writer, workers, _submit_archive_member):
+                done = update.pop("done", False)
+                summary = update
+                if not done:
+                    yield _format_event("progress", {**update, "total": total}, stream_format)
+        finally:
+            writer.close()
+            register_output(result_path)  # partial results too; counts towards OUTPUT_MAX_BYTES / OUTPUT_TTL_SECONDS
+
+        base_url = os.getenv("PUBLIC_BASE_URL", "")
+        yield _format_event("end", {
+            **summary,
+            "result_url": f"/output/{result_name}",
+            "result_url_absolute": f"{base_url}/output/{result_name}" if base_url else f"/output/{result_name}",
+        }, stream_format)
+    except Exception as e:
+        print(f"❌ Error in analyze_archive: {e}")
+        yield _format_event("error", {"error": str(e), **summary}, stream_format)
+    finally:
+        cleanup.close()
+
+@app.post("/analyze/archive")
+async def analyze_archive(
+    file: UploadFile = File(...),
+    detectors: str = Query(None, description="Comma-separated subset of: " + ", ".join(ANALYZERS)),
+    output: str = Query("csv", pattern="^(csv|parquet)$", description="Results file format: csv or parquet (needs pyarrow)"),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="ndjson or sse (text/event-stream)"),
+):
+    """
+    Bulk analysis of a survey: a zip / tar(.gz|.bz2|.xz) of images, or a .txt manifest of
+    image paths under ARCHIVE_ROOT. Images are streamed out of the archive and through the
+    selected detectors on the "archive" executor, shared by all archive requests; progress streams back while one CSV or
+    Parquet file of detections is written under /output.
+    """
+    names, error = _parse_detectors(detectors)
+    if error:
+        return error
+    try:
+        kind = archive_kind(file.filename)
+        check_output_format(output)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    cleanup = contextlib.ExitStack()
+    try:
+        print(f"🔍 Debug: Received archive for {names}: {file.filename}, content_type: {file.content_type}")
+        path = cleanup.enter_context(temp_file(file.filename))
+        await _spool_upload(file, path, ARCHIVE_MAX_BYTES, "Archive larger than ARCHIVE_MAX_BYTES")
+    except UploadRejected as e:
+        cleanup.close()
+        return _rejected_response(e)
+    except Exception as e:
+        cleanup.close()
+        import traceback
+        print(f"❌ Error in analyze_archive: {e}")
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_archive(cleanup, path, kind, names, output, result_filename(file.filename, output), stream_format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(cleanup.close),
+    )
+
+def _job_analyzer(names):
+    """Per-image analyze function for a job's detectors (see jobs.py)."""
+    return functools.partial(_analyze_member, names, shared_decode_target(names))
+
+def _job_fields(job):
+    job = {**job, "status_url": f"/jobs/{job['id']}", "events_url": f"/jobs/{job['id']}/events"}
+    job["result_url"] = f"/jobs/{job['id']}/result" if job["started_at"] else None
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    detectors: str = Query(None, description="Comma-separated subset of: " + ", ".join(ANALYZERS)),
+):
+    """
+    Queue a long-running batch job: the same inputs as /analyze/archive (zip, tar or
+    manifest), run by the job workers instead of the request. Returns the job ID at once;
+    poll /jobs/{id} or stream /jobs/{id}/events. Jobs survive restarts and resume.
+    """
+    names, error = _parse_detectors(detectors)
+    if error:
+        return error
+    try:
+        kind = archive_kind(file.filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    job_id = jobs.new_job_id()
+    try:
+        print(f"🔍 Debug: Received job input for {names}: {file.filename}, content_type: {file.content_type}")
+        path = jobs.input_path(job_id, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        await _spool_upload(file, path, ARCHIVE_MAX_BYTES, "Archive larger than ARCHIVE_MAX_BYTES")
+        job = await asyncio.to_thread(jobs.create_job, job_id, names, kind, os.path.basename(file.filename))
+    except UploadRejected as e:
+        shutil.rmtree(jobs.job_dir(job_id), ignore_errors=True)
+        return _rejected_response(e)
+    except Exception as e:
+        shutil.rmtree(jobs.job_dir(job_id), ignore_errors=True)
+        import traceback
+        print(f"❌ Error in submit_job: {e}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return JSONResponse(status_code=202, content=_job_fields(job))
+
+@app.get("/jobs")
+def list_jobs(
+    status: str = Query(None, pattern="^(queued|running|done|failed|cancelled)$"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Most recent jobs first."""
+    return {"jobs": [_job_fields(job) for job in jobs.list_jobs(status, limit)]}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status and progress counters of one job."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return _job_fields(job)
+
+async def _stream_job(job_id, stream_format):
+    last = None
+    while True:
+        job = await asyncio.to_thread(jobs.get_job, job_id)
+        if job is None:
+            yield _format_event("error", {"error": f"Job {job_id} was deleted"}, stream_format)
+            return
+        if job["status"] in jobs.TERMINAL:
+            yield _format_event("end", _job_fields(job), stream_format)
+            return
+        if job["updated_at"] != last:
+            last = job["updated_at"]
+            yield _format_event("progress", _job_fields(job), stream_format)
+        await asyncio.sleep(1)
+
+@app.get("/jobs/{job_id}/events")
+def job_events(
+    job_id: str,
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="ndjson or sse (text/event-stream)"),
+):
+    """Stream a job's progress until it finishes; reconnecting simply resumes from its current state."""
+    if jobs.get_job(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_job(job_id, stream_format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """The job's CSV of detections; partial while it is still running."""
+    job = jobs.get_job(job_id)
+    path = jobs.result_path(job_id)
+    if job is None or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": f"No results for job: {job_id}"})
+    stem = os.path.splitext(job["input_name"])[0]
+    return FileResponse(path, media_type="text/csv", filename=f"{stem}_detections.csv")
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Stop a queued or running job; results written so far are kept."""
+    job = jobs.cancel_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return _job_fields(job)
+
+@app.delete("/jobs/{job_id}", status_code=204)
+def delete_job(job_id: str):
+    """Remove a finished job and its files; 409 while it is still queued or running."""
+    if jobs.delete_job(job_id):
+        return Response(status_code=204)
+    if jobs.get_job(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return JSONResponse(status_code=409, content={"error": f"Job {job_id} is still active; cancel it first"})
+
+def _parse_list(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+@app.get("/detections")
+def detections(
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat (WGS84 degrees)"),
+    type: str = Query(None, description="Comma-separated subset of: " + ", ".join(ANALYZERS)),
+    label: str = Query(None, description="Comma-separated detection labels"),
+    min_confidence: float = Query(None, ge=0, le=1),
+    limit: int = Query(DETECTIONS_QUERY_LIMIT, ge=1, le=DETECTIONS_QUERY_LIMIT),
+):
+    """
+    Stored detections from geotagged uploads inside a map viewport, answered from the
+    R*Tree index (see detectors/detection_store.py). ``truncated`` is true when the
+    viewport holds more than ``limit`` detections.
+    """
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "bbox must be min_lng,min_lat,max_lng,max_lat"})
+    if min_lng > max_lng or min_lat > max_lat:
+        return JSONResponse(status_code=400, content={"error": "bbox minimums must not exceed its maximums"})
+    types = _parse_list(type)
+    unknown = [t for t in types or () if t not in ANALYZERS]
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Unknown types: {unknown}. Choose from: {list(ANALYZERS)}"})
+
+    start = time.perf_counter()
+    rows, truncated = query_detections((min_lng, min_lat, max_lng, max_lat), types, _parse_list(label), min_confidence, limit)
+    return {
+        "detections": rows,
+        "count": len(rows),
+        "truncated": truncated,
+        "timing_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+def _signal_response(request, zoom, cell_range, fields):
+    """Clusters + points for a cell range, with the inventory version as ETag (304 when unchanged)."""
+    try:
+        version, clusters, points = get_inventory().query(zoom, cell_range)
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={SIGNAL_TILES_MAX_AGE}"}
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    content = {**fields, "zoom": zoom, "version": version, "clusters": clusters, "points": points}
+    return JSONResponse(content=content, headers=headers)
+
+@app.get("/signals/clusters")
+def signal_clusters(
+    request: Request,
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat (WGS84 degrees)"),
+    zoom: int = Query(..., ge=0, le=MAX_ZOOM),
+):
+    """
+    The traffic-signal inventory for a map viewport: pre-aggregated clusters (count,
+    centroid, conditions) and the single points visible at ``zoom``, every point above
+    CLUSTER_MAX_ZOOM (see detectors/signal_inventory.py).
+    """
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "bbox must be min_lng,min_lat,max_lng,max_lat"})
+    if min_lng > max_lng or min_lat > max_lat:
+        return JSONResponse(status_code=400, content={"error": "bbox minimums must not exceed its maximums"})
+    return _signal_response(request, zoom, viewport_cells(zoom, (min_lng, min_lat, max_lng, max_lat)), {})
+
+@app.get("/signals/tiles/{z}/{x}/{y}")
+def signal_tile(request: Request, z: int, x: int, y: int):
+    """
+    The same clusters and points cut into XYZ map tiles (each cluster belongs to exactly one
+    tile), so a map can fetch and cache them per tile like raster tiles.
+    """
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        return JSONResponse(status_code=404, content={"error": f"No tile {z}/{x}/{y}"})
+    return _signal_response(request, z, tile_cells(x, y), {"tile": [z, x, y]})
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
@@ -191,4 +974,53 @@ def healthz():
 def health():
     return {"status": "ok"}
 
+@app.get("/readyz")
+def readyz():
+    """Per-model load state; 503 until every warmed model is ready (when WARMUP_ON_STARTUP is on)."""
+    status = readiness(WARMUPS)
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/stats/inference")
+def stats_inference():
+    """Per-detector executor occupancy and rejected (503) request counts."""
+    return executor_stats()
+
+@app.get("/stats/cache")
+def stats_cache():
+    """Result cache hit/miss/eviction counters and tier sizes."""
+    return cache_stats()
+
+@app.get("/stats/storage")
+def stats_storage():
+    """File counts, bytes, evictions and free disk space for output/ and temp/."""
+    return storage_stats()
+
+@app.get("/stats/render")
+def stats_render():
+    """Annotated-image renders per mode and deferred renders still pending."""
+    return render_stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, request/error/in-flight counts and model load/memory."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats/batching")
+def stats_batching():
+    """Per-model micro-batching stats (batch sizes, queue wait) for tuning BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS."""
+    return batching_stats()
+
+@app.get("/stats/detections")
+def stats_detections():
+    """Detection store writes: images stored, duplicates skipped, uploads without GPS, queue depth."""
+    return store_stats()
+
+@app.get("/stats/signals")
+def stats_signals():
+    """Signal inventory index: version, point and cell counts, incremental reloads."""
+    return get_inventory().stats()
 
+@app.get("/stats/jobs")
+def stats_jobs():
+    """Job counts per status and the job worker configuration."""
+    return jobs.job_stats()
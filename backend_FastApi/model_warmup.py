@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from detectors.metrics import add_model_load_listener
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Opt-in: load every model (in parallel) and run one dummy forward pass at startup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0").lower() in ("1", "true", "yes")
+# Comma-separated subset of detector names to warm (default: all)
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "6"))
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_states = {}
+_states_lock = threading.Lock()
+_started = False
+
+
+def _set_state(name, **fields):
+    with _states_lock:
+        _states.setdefault(name, {"state": NOT_LOADED})
+        _states[name].update(fields)
+
+
+def _warm_one(name, warmup_fn):
+    _set_state(name, state=LOADING, error=None)
+    start = time.perf_counter()
+    try:
+        warmup_fn()
+    except Exception as e:
+        logger.error(f"❌ Warm-up failed for {name}: {e}")
+        _set_state(name, state=FAILED, error=str(e), load_seconds=round(time.perf_counter() - start, 3))
+        return
+    elapsed = round(time.perf_counter() - start, 3)
+    _set_state(name, state=READY, load_seconds=elapsed)
+    logger.info(f"✅ {name} model warmed up in {elapsed}s")
+
+
+def selected_models(warmups):
+    names = [n.strip() for n in WARMUP_MODELS.split(",") if n.strip()] or list(warmups)
+    return [n for n in names if n in warmups]
+
+
+def start_warmup(warmups):
+    """
+    Load and warm the selected models in parallel on background threads, so the event
+    loop keeps serving /healthz while /readyz reports progress. ``warmups`` maps
+    detector name -> zero-argument warm-up function.
+    """
+    global _started
+    names = selected_models(warmups)
+    with _states_lock:
+        _started = True
+        for name in warmups:
+            _states.setdefault(name, {"state": NOT_LOADED})
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(WARMUP_WORKERS, len(names) or 1)), thread_name_prefix="warmup")
+    for name in names:
+        pool.submit(_warm_one, name, warmups[name])
+    pool.shutdown(wait=False)
+    return names
+
+
+def warm_now(warmups, names):
+    """
+    Load and warm ``names`` one at a time on the calling thread. serve.py uses this in the
+    master process before forking workers, where no background threads may be running.
+    """
+    with _states_lock:
+        for name in warmups:
+            _states.setdefault(name, {"state": NOT_LOADED})
+    for name in names:
+        _warm_one(name, warmups[name])
+    return names
+
+
+def track_lazy_loads(model_names):
+    """
+    Keep the states current for models a request loads on its own. ``model_names`` maps the
+    names track_model_load reports (detectors/metrics.py) to detector names. A model being
+    warmed up is left to _warm_one, which marks it READY only after its forward pass.
+    """
+    def listener(model_name, error, seconds):
+        name = model_names.get(model_name)
+        if name is None:
+            return
+        with _states_lock:
+            state = _states.setdefault(name, {"state": NOT_LOADED})
+            if state["state"] != LOADING:
+                state.update(state=FAILED if error else READY, error=error, load_seconds=round(seconds, 3))
+
+    add_model_load_listener(listener)
+
+
+def readiness(warmups):
+    """
+    Per-model state and overall readiness. Without WARMUP_ON_STARTUP models still load
+    lazily on first request and the pod counts as ready; with it, the pod is ready once
+    every selected model is READY.
+    """
+    with _states_lock:
+        models = {name: dict(_states.get(name, {"state": NOT_LOADED})) for name in warmups}
+        started = _started
+    required = selected_models(warmups) if started else []
+    ready = all(models[name]["state"] == READY for name in required)
+    return {"ready": ready, "warmup": started, "models": models}
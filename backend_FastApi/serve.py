@@ -0,0 +1,157 @@
+import os
+import gc
+import time
+import signal
+import socket
+import logging
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Preload-then-fork serving: `python serve.py` imports torch and loads the models once in this
+# master process, then forks SERVE_WORKERS uvicorn workers on one shared listening socket. The
+# workers share the weights' memory pages copy-on-write, so N workers cost about one model set.
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "0"))  # 0 = one per CPU in the container's quota
+# Torch intra-op threads per worker; 0 = the CPU quota split evenly across workers
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+# Load models before forking (the WARMUP_MODELS subset, default all); 0 = workers load lazily as before
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+_RESPAWN_DELAY = 1.0  # s; a worker that dies faster than this is restarted after a pause
+
+
+
+def _listen(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _freeze_weights(modules):
+    """Inference-only weights: no autograd state is ever written into the shared tensors."""
+    import torch
+
+    for module in modules:
+        model = getattr(module, "_model", None)
+        net = getattr(model, "model", model)  # ultralytics YOLO wraps the nn.Module
+        if isinstance(net, torch.nn.Module):
+            net.eval()
+            net.requires_grad_(False)
+
+
+def preload(model_api):
+    """
+    Load and warm the selected torch models in this process. The dummy forward pass matters:
+    ultralytics fuses Conv+BN on the first call, which rewrites the weights, so it has to
+    happen before the fork rather than once per worker.
+    """
+    import torch
+    from detectors.onnx_backend import inference_backend
+    from detectors.registry import DETECTORS, detector_module
+    from model_warmup import selected_models, warm_now
+
+    def on_onnx(name):
+        # ONNX Runtime sessions own thread pools that don't survive fork(), so those detectors load in
+        # each worker. Only the YOLO detectors (letterboxed to YOLO_IMGSZ) honour <PREFIX>_BACKEND.
+        spec = DETECTORS[name]
+        return bool(spec.min_long_side) and inference_backend(spec.env_prefix) == "onnx"
+
+    # One thread, so no OpenMP pool exists in the master to be inherited half-alive by the workers
+    torch.set_num_threads(1)
+    names = [name for name in selected_models(model_api.WARMUPS) if not on_onnx(name)]
+    warm_now(model_api.WARMUPS, names)
+    _freeze_weights(detector_module(name) for name in names)
+    return names
+
+
+def _run_worker(app, sock, threads):
+    import uvicorn
+    import torch
+    from detectors.cpu_quota import set_worker_cpus
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    torch.set_num_threads(threads)
+    set_worker_cpus(threads)  # also sizes ONNX Runtime sessions created in this worker
+    server = uvicorn.Server(uvicorn.Config(app, log_level=LOG_LEVEL, timeout_graceful_shutdown=30))
+    server.run(sockets=[sock])
+
+
+def _spawn(app, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            _run_worker(app, sock, threads)
+            code = 0
+        except BaseException as e:
+            logger.error(f"❌ Worker {os.getpid()} crashed: {e}")
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    # Per the gc.freeze() docs: no collections in the master (they leave freed holes in pages the
+    # workers share), freeze before fork, re-enable in each worker
+    gc.disable()
+    from detectors.cpu_quota import available_cpus
+
+    cpus = available_cpus()
+    workers = SERVE_WORKERS or cpus
+    threads = TORCH_THREADS or max(1, cpus // workers)
+    sock = _listen(HOST, PORT)
+
+    import model_api
+
+    if PRELOAD_MODELS:
+        start = time.perf_counter()
+        names = preload(model_api)
+        logger.info(f"✅ Preloaded {names} in {time.perf_counter() - start:.1f}s")
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    logger.info(f"🚀 Serving on {HOST}:{PORT} with {workers} workers x {threads} torch threads ({cpus} CPUs)")
+    for _ in range(workers):
+        children[_spawn(model_api.app, sock, threads)] = time.monotonic()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.error(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started < _RESPAWN_DELAY:
+            time.sleep(_RESPAWN_DELAY)
+        if not stopping:
+            children[_spawn(model_api.app, sock, threads)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()